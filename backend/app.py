@@ -1,29 +1,430 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
-from pymongo import MongoClient
+import pymongo
+from pymongo import MongoClient, ReturnDocument, ASCENDING, ReplaceOne, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from pymongo.read_preferences import Primary, SecondaryPreferred, Nearest
 from dotenv import load_dotenv
 import os
 import bcrypt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from jose import JWTError, jwt
-from bson import ObjectId
+from bson import ObjectId, json_util
+from bisect import bisect_left
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import atexit
+import base64
+import contextvars
+import gc
+import hashlib
+import heapq
+import hmac
+import json
+import queue
+import random
 import re
+import secrets
+import sys
+import threading
+import time
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*", "allow_headers": "*", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"]}})
+CORS(app, resources={r"/api/*": {"origins": "*", "allow_headers": "*", "expose_headers": ["X-Causal-Token", "X-Directory-Version", "ETag"], "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"]}})
+
+# Database timeouts and circuit breaker configuration
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '2000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '2000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '5000'))
+MONGO_TIMEOUT_MS = int(os.getenv('MONGO_TIMEOUT_MS', '10000'))
+DEFAULT_REQUEST_DEADLINE_MS = int(os.getenv('REQUEST_DEADLINE_MS', '2000'))
+ROUTE_DEADLINES_MS = {
+    "get_appointments": 5000,
+    "bulk_update_appointment_status": 5000,
+    "get_doctors": 3000,
+    "get_dashboard_bootstrap": 5000,
+}
+CIRCUIT_WINDOW_SIZE = 50
+CIRCUIT_MIN_CALLS = 10
+CIRCUIT_FAILURE_RATIO = 0.5
+CIRCUIT_OPEN_SECONDS = int(os.getenv('CIRCUIT_OPEN_SECONDS', '15'))
+CIRCUIT_SLOW_COMMAND_MS = int(os.getenv('CIRCUIT_SLOW_COMMAND_MS', '1000'))
+# Endpoints that can answer from a local cache while the database is unavailable
+STALE_READ_ENDPOINTS = {"get_doctors"}
+# Server error codes that mean the database itself is unhealthy, not the request
+UNHEALTHY_MONGO_ERROR_CODES = {50, 89, 91, 189, 262, 10107, 11600, 11602, 13435, 13436}
+
+class CircuitBreaker:
+    """Opens when too many recent Mongo operations fail or run slow.
+
+    While open, requests are rejected up front instead of tying up a worker
+    until the driver times out. After ``open_seconds`` a single trial request
+    is let through; everyone else is still turned away until the next
+    recorded outcome either closes or re-opens the circuit.
+    """
+
+    def __init__(self, window_size, min_calls, failure_ratio, open_seconds):
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window_size)
+        self._min_calls = min_calls
+        self._failure_ratio = failure_ratio
+        self._open_seconds = open_seconds
+        self._opened_at = None
+        self._trial_thread = None
+
+    def _is_open(self, now):
+        if self._opened_at is None:
+            return False
+        if now - self._opened_at < self._open_seconds:
+            return True
+        # Half-open: only the thread serving the trial request may use the database
+        return self._trial_thread != threading.get_ident()
+
+    def is_open(self):
+        with self._lock:
+            return self._is_open(time.monotonic())
+
+    def allow_request(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._opened_at is None:
+                return True
+            if now - self._opened_at < self._open_seconds:
+                return False
+            if self._trial_thread is None:
+                self._trial_thread = threading.get_ident()
+            return self._trial_thread == threading.get_ident()
+
+    def release_trial(self):
+        # A trial request that finished without touching the database lets
+        # the next request try instead
+        with self._lock:
+            if self._trial_thread == threading.get_ident():
+                self._trial_thread = None
+
+    def record(self, ok):
+        with self._lock:
+            now = time.monotonic()
+            if self._opened_at is not None:
+                if now - self._opened_at < self._open_seconds:
+                    return
+                # Half-open: the first outcome after the cool-down decides
+                self._trial_thread = None
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = now
+                return
+            
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self._min_calls and failures / len(self._outcomes) >= self._failure_ratio:
+                self._opened_at = now
+                self._outcomes.clear()
+                print(f"Database circuit opened after {failures} failed or slow operations")
+
+class CircuitBreakerCommandListener(monitoring.CommandListener):
+    def __init__(self, breaker):
+        self.breaker = breaker
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.breaker.record(event.duration_micros < CIRCUIT_SLOW_COMMAND_MS * 1000)
+
+    def failed(self, event):
+        failure = event.failure if isinstance(event.failure, dict) else {}
+        code = failure.get("code")
+        # Network errors and timeouts carry no server error code
+        if code is None or code in UNHEALTHY_MONGO_ERROR_CODES:
+            self.breaker.record(False)
+
+class CircuitBreakerHeartbeatListener(monitoring.ServerHeartbeatListener, monitoring.TopologyListener):
+    """Counts failed heartbeats, but only for servers that can take writes.
+
+    A dead secondary should not open the circuit while the primary is
+    healthy. Once no writable server is known (a standalone that went down,
+    or a replica set without a primary), every failed heartbeat counts.
+    """
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.writable_servers = set()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        writable_servers = self.writable_servers
+        if not writable_servers or event.connection_id in writable_servers:
+            self.breaker.record(False)
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        self.writable_servers = {
+            address
+            for address, description in event.new_description.server_descriptions().items()
+            if description.is_writable
+        }
+
+    def closed(self, event):
+        pass
+
+# Read routing configuration. To try it locally, start three mongod processes
+# on ports 27017-27019 with --replSet rs0, run rs.initiate() and point
+# MONGODB_URI at mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0
+READ_MAX_STALENESS_SECONDS = int(os.getenv('READ_MAX_STALENESS_SECONDS', '90'))
+READ_PREFERENCES = {
+    "primary": Primary(),
+    "secondaryPreferred": SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS),
+    "nearest": Nearest(max_staleness=READ_MAX_STALENESS_SECONDS),
+}
+# Heavy list reads may go to secondaries; anything not listed reads from the primary
+ROUTE_READ_PREFERENCES = {
+    "get_appointments": os.getenv('APPOINTMENTS_READ_PREFERENCE', 'secondaryPreferred'),
+    "get_users": os.getenv('USERS_READ_PREFERENCE', 'secondaryPreferred'),
+    "get_dashboard_bootstrap": os.getenv('APPOINTMENTS_READ_PREFERENCE', 'secondaryPreferred'),
+}
+CAUSAL_SESSION_CACHE_SIZE = 10000
+
+# Request profiling configuration. Nothing is hooked into the request path
+# unless PROFILING_ENABLED is set when the app starts.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+PROFILING_SECRET = os.getenv('PROFILING_SECRET', os.getenv('SECRET_KEY', 'your-secret-key'))
+PROFILING_TOKEN_TTL_SECONDS = 600
+PROFILING_SAMPLE_INTERVAL_SECONDS = 0.001
+PROFILING_OUTPUT_DIR = os.getenv('PROFILING_OUTPUT_DIR', 'profiles')
+# Fraction of traffic to profile per endpoint, e.g. "get_appointments=0.01,get_users=0.05"
+PROFILING_SAMPLE_RATES = {
+    endpoint: float(rate)
+    for endpoint, rate in (item.split('=') for item in os.getenv('PROFILING_SAMPLE_RATES', '').split(',') if item)
+}
+# Rates changed through the admin API are stored in db.settings and picked up
+# by every worker process within this many seconds
+PROFILING_SAMPLING_REFRESH_SECONDS = 10
+
+class MongoWaitListener(monitoring.CommandListener):
+    """Adds up time spent waiting on Mongo for the request being profiled."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._add(event)
+
+    def failed(self, event):
+        self._add(event)
+
+    def _add(self, event):
+        if getattr(self.local, "active", False):
+            self.local.wait_micros += event.duration_micros
+            self.local.commands += 1
+
+mongo_wait_listener = MongoWaitListener()
+
+mongo_breaker = CircuitBreaker(CIRCUIT_WINDOW_SIZE, CIRCUIT_MIN_CALLS, CIRCUIT_FAILURE_RATIO, CIRCUIT_OPEN_SECONDS)
 
 # MongoDB configuration
-client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+client = MongoClient(
+    os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    timeoutMS=MONGO_TIMEOUT_MS,
+    event_listeners=[CircuitBreakerCommandListener(mongo_breaker), CircuitBreakerHeartbeatListener(mongo_breaker)]
+        + ([mongo_wait_listener] if PROFILING_ENABLED else [])
+)
 db = client.hospivibe
+routed_dbs = {name: db.with_options(read_preference=preference) for name, preference in READ_PREFERENCES.items()}
+
+# Last write time seen for each user, so their next read can wait for it.
+# This map only covers requests served by this process; clients that echo
+# the X-Causal-Token response header back get read-your-writes across
+# worker processes too.
+_causal_times = OrderedDict()
+_causal_times_lock = threading.Lock()
+
+@app.before_request
+def enforce_request_deadline():
+    if request.method == 'OPTIONS':
+        return
+    
+    # Stale-read endpoints still ask, so one of them can be the half-open trial
+    if not mongo_breaker.allow_request() and request.endpoint not in STALE_READ_ENDPOINTS:
+        return jsonify({"error": "Database temporarily unavailable"}), 503, {"Retry-After": str(CIRCUIT_OPEN_SECONDS)}
+    
+    # Every pymongo call made by this request shares one deadline and is sent
+    # with maxTimeMS set to whatever is left of it
+    deadline_ms = ROUTE_DEADLINES_MS.get(request.endpoint, DEFAULT_REQUEST_DEADLINE_MS)
+    g.mongo_deadline = pymongo.timeout(deadline_ms / 1000)
+    g.request_deadline = time.monotonic() + deadline_ms / 1000
+    g.mongo_deadline.__enter__()
+
+@app.teardown_request
+def release_request_deadline(exc):
+    mongo_breaker.release_trial()
+    deadline = g.pop('mongo_deadline', None)
+    if deadline is not None:
+        deadline.__exit__(None, None, None)
+
+def routed_db():
+    """Database handle using the read preference configured for this route."""
+    return routed_dbs.get(ROUTE_READ_PREFERENCES.get(request.endpoint, "primary"), db)
+
+def encode_causal_token(user_id, cluster_time, operation_time):
+    payload = base64.urlsafe_b64encode(json_util.dumps({
+        "user_id": user_id,
+        "cluster_time": cluster_time,
+        "operation_time": operation_time
+    }, json_options=json_util.CANONICAL_JSON_OPTIONS).encode('utf-8')).decode('ascii')
+    signature = hmac.new(SECRET_KEY.encode('utf-8'), payload.encode('ascii'), hashlib.sha256).hexdigest()
+    return f"{payload}.{signature}"
+
+def decode_causal_token(token, user_id):
+    """Cluster and operation time from a client's X-Causal-Token, or None."""
+    payload, _, signature = (token or "").partition('.')
+    expected = hmac.new(SECRET_KEY.encode('utf-8'), payload.encode('ascii'), hashlib.sha256).hexdigest()
+    if not payload or not hmac.compare_digest(signature, expected):
+        return None
+    data = json_util.loads(base64.urlsafe_b64decode(payload.encode('ascii')), json_options=json_util.CANONICAL_JSON_OPTIONS)
+    if data.get("user_id") != user_id:
+        return None
+    return data["cluster_time"], data["operation_time"]
+
+def request_session(user_id):
+    """Causally consistent session for the current request.
+
+    The session starts from the user's last recorded write, taken from this
+    process and from the client's X-Causal-Token header, so a read routed to
+    a secondary waits until that secondary has caught up with it.
+    """
+    if 'mongo_session' not in g:
+        session = client.start_session(causal_consistency=True)
+        with _causal_times_lock:
+            last_write = _causal_times.get(user_id)
+        for known in (last_write, decode_causal_token(request.headers.get('X-Causal-Token'), user_id)):
+            if known:
+                session.advance_cluster_time(known[0])
+                session.advance_operation_time(known[1])
+        g.mongo_session = session
+        g.mongo_session_user_id = user_id
+    return g.mongo_session
+
+@app.after_request
+def send_causal_token(response):
+    session = g.get('mongo_session')
+    if session is not None and session.cluster_time is not None and session.operation_time is not None:
+        response.headers['X-Causal-Token'] = encode_causal_token(
+            g.mongo_session_user_id, session.cluster_time, session.operation_time
+        )
+    return response
+
+@app.teardown_request
+def end_request_session(exc):
+    session = g.pop('mongo_session', None)
+    if session is None:
+        return
+    user_id = g.pop('mongo_session_user_id')
+    if session.cluster_time is not None and session.operation_time is not None:
+        with _causal_times_lock:
+            _causal_times[user_id] = (session.cluster_time, session.operation_time)
+            _causal_times.move_to_end(user_id)
+            while len(_causal_times) > CAUSAL_SESSION_CACHE_SIZE:
+                _causal_times.popitem(last=False)
+    session.end_session()
 
 # JWT configuration
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv('REFRESH_TOKEN_EXPIRE_DAYS', '14'))
+
+# Startup task configuration
+STARTUP_RETRY_SECONDS = 5
+STARTUP_RETRY_MAX_SECONDS = 300
+
+# Doctor directory configuration
+DOCTOR_DIRECTORY_FIELDS = ["name", "email", "specialty"]
+DOCTOR_DIRECTORY_VERSION_CHECK_SECONDS = int(os.getenv('DOCTOR_DIRECTORY_VERSION_CHECK_SECONDS', '5'))
+DOCTOR_DIRECTORY_SEARCH_LIMIT = 20
+
+# Appointment archive configuration
+ARCHIVER_ENABLED = os.getenv('ARCHIVER_ENABLED', '1') == '1'
+ARCHIVE_HORIZON_DAYS = int(os.getenv('ARCHIVE_HORIZON_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv('ARCHIVE_INTERVAL_SECONDS', '3600'))
+TERMINAL_APPOINTMENT_STATUSES = ["completed", "cancelled", "no-show", "Completed", "Cancelled"]
+
+# Audit log configuration
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '500'))
+AUDIT_FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', '1'))
+AUDIT_ENQUEUE_TIMEOUT_SECONDS = 0.05
+AUDIT_REPLAY_SECONDS = 30
+AUDIT_SPILL_PATH = os.getenv('AUDIT_SPILL_PATH', 'audit_spill.jsonl')
+
+# Idempotency configuration
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_CACHE_SIZE = 10000
+IDEMPOTENCY_WAIT_SECONDS = 5
+# An in-progress claim older than this is treated as abandoned by a crashed worker
+IDEMPOTENCY_LEASE_SECONDS = 30
+# Budget kept back from the request deadline for the reply after a wait
+IDEMPOTENCY_DEADLINE_MARGIN_SECONDS = 0.25
+IDEMPOTENCY_POLL_SECONDS = 0.05
+# How often a response that could not be stored is written again
+IDEMPOTENCY_STORE_RETRY_SECONDS = 1
+
+# Appointment reminder configuration
+REMINDERS_ENABLED = os.getenv('REMINDERS_ENABLED', '1') == '1'
+REMINDER_LEAD_MINUTES = int(os.getenv('REMINDER_LEAD_MINUTES', '1440'))
+# Appointment dates and times are wall-clock times at the clinic
+CLINIC_TIMEZONE = ZoneInfo(os.getenv('CLINIC_TIMEZONE', 'UTC'))
+REMINDER_WINDOW_SECONDS = 600
+REMINDER_POLL_SECONDS = 60
+REMINDER_BATCH_SIZE = 100
+REMINDER_CLAIM_TIMEOUT_SECONDS = 300
+REMINDER_SINK = os.getenv('REMINDER_SINK', 'log')
+
+# Bulk update configuration
+BULK_UPDATE_MAX_ITEMS = 200
+
+# Dashboard bootstrap configuration
+BOOTSTRAP_WORKERS = int(os.getenv('BOOTSTRAP_WORKERS', '8'))
+BOOTSTRAP_WINDOW_DAYS = 14
+BOOTSTRAP_APPOINTMENT_LIMIT = 50
+
+# Nurse monitoring configuration
+NURSE_PATIENT_STATUSES = ["Stable", "Needs Attention", "Improving"]
+NURSE_PATIENT_PRIORITIES = ["High", "Normal", "Low"]
+NURSE_PATIENT_FIELDS = ["name", "room", "status", "priority", "notes"]
+SHIFT_START_HOURS = [7, 15, 23]
+SHIFT_RECENT_NOTES = 10
+SHIFT_STATS_RETENTION_DAYS = 30
+
+# Vitals storage configuration
+VITALS_BUCKET_SECONDS = 3600
+VITALS_BUCKET_SIZE = 200
+VITALS_MAX_BATCH = 1000
+VITALS_DEFAULT_RANGE_HOURS = 24
+VITALS_DEFAULT_INTERVAL_SECONDS = 3600
+VITALS_MAX_POINTS = 2000
 
 # Helper functions
 def create_access_token(data: dict):
@@ -33,6 +434,25 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def create_refresh_token(user_id: str, family_id: str = None, expires_at: datetime = None):
+    # Only the hash is stored; tokens from one login share a family so that
+    # reuse of a rotated token can revoke the whole chain. Rotation keeps the
+    # family's original expiry, which caps the lifetime of a login session.
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    db.refresh_tokens.insert_one({
+        "token_hash": hash_refresh_token(token),
+        "user_id": user_id,
+        "family_id": family_id or secrets.token_hex(16),
+        "used": False,
+        "created_at": now,
+        "expires_at": expires_at or now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    })
+    return token
+
 def verify_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -40,6 +460,52 @@ def verify_token(token: str):
     except JWTError:
         return None
 
+# Startup tasks (indexes, background workers) run once, in a background
+# thread kicked off by the first request, so they never hold up traffic
+startup_tasks = []
+_startup_lock = threading.Lock()
+_startup_thread = None
+
+def on_startup(func):
+    startup_tasks.append(func)
+    return func
+
+def run_startup_tasks():
+    # A new thread starts without the request's pymongo.timeout, so these
+    # calls only get the client-wide timeoutMS
+    pending = list(startup_tasks)
+    delay = STARTUP_RETRY_SECONDS
+    while pending:
+        for task in list(pending):
+            try:
+                task()
+                pending.remove(task)
+            except Exception as e:
+                print(f"Startup task {task.__name__} failed, retrying in {delay}s: {e}")
+        if pending:
+            time.sleep(delay)
+            delay = min(delay * 2, STARTUP_RETRY_MAX_SECONDS)
+
+@app.before_request
+def start_startup_tasks():
+    global _startup_thread
+    if _startup_thread is not None:
+        return
+    with _startup_lock:
+        if _startup_thread is None:
+            _startup_thread = threading.Thread(target=run_startup_tasks, name="startup-tasks", daemon=True)
+            _startup_thread.start()
+
+def bump_doctor_directory_version():
+    # Shared counter so every worker notices that its snapshot is out of date
+    result = db.counters.find_one_and_update(
+        {"_id": "doctor_directory"},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    doctor_directory.invalidate(result["version"])
+
 def validate_email(email: str) -> bool:
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return bool(re.match(pattern, email))
@@ -94,12 +560,17 @@ def register():
         # Insert user into database
         result = db.users.insert_one(user)
         
-        # Create access token
+        if user["role"] == "doctor":
+            bump_doctor_directory_version()
+        
+        # Create access and refresh tokens
         access_token = create_access_token({"sub": str(result.inserted_id)})
+        refresh_token = create_refresh_token(str(result.inserted_id))
         
         return jsonify({
             "message": "User registered successfully",
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "user": {
                 "id": str(result.inserted_id),
@@ -129,11 +600,13 @@ def login():
         if not user or not bcrypt.checkpw(data["password"].encode('utf-8'), user["password"]) or user["role"] != data["role"]:
             return jsonify({"error": "Invalid credentials"}), 401
         
-        # Create access token
+        # Create access and refresh tokens
         access_token = create_access_token({"sub": str(user["_id"])})
+        refresh_token = create_refresh_token(str(user["_id"]))
         
         return jsonify({
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "user": {
                 "id": str(user["_id"]),
@@ -147,6 +620,65 @@ def login():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@on_startup
+def ensure_refresh_token_indexes():
+    db.refresh_tokens.create_index([("token_hash", ASCENDING)], unique=True)
+    db.refresh_tokens.create_index([("family_id", ASCENDING)])
+    db.refresh_tokens.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh_access_token():
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get("refresh_token"):
+            return jsonify({"error": "Missing refresh token"}), 400
+        
+        token_hash = hash_refresh_token(data["refresh_token"])
+        now = datetime.utcnow()
+        
+        # Claim the token atomically so two concurrent refreshes cannot both rotate it
+        stored = db.refresh_tokens.find_one_and_update(
+            {"token_hash": token_hash, "used": False, "expires_at": {"$gt": now}},
+            {"$set": {"used": True, "used_at": now}}
+        )
+        
+        if not stored:
+            reused = db.refresh_tokens.find_one({"token_hash": token_hash, "used": True})
+            if reused:
+                # A rotated token came back: assume it was stolen and revoke the family
+                db.refresh_tokens.delete_many({"family_id": reused["family_id"]})
+            return jsonify({"error": "Invalid refresh token"}), 401
+        
+        access_token = create_access_token({"sub": stored["user_id"]})
+        refresh_token = create_refresh_token(stored["user_id"], stored["family_id"], stored["expires_at"])
+        
+        return jsonify({
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "token_type": "bearer"
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/auth/logout', methods=['POST'])
+def logout():
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get("refresh_token"):
+            return jsonify({"error": "Missing refresh token"}), 400
+        
+        stored = db.refresh_tokens.find_one({"token_hash": hash_refresh_token(data["refresh_token"])})
+        if stored:
+            db.refresh_tokens.delete_many({"family_id": stored["family_id"]})
+        
+        return jsonify({"message": "Logged out successfully"})
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/user/profile', methods=['GET'])
 def get_profile():
     try:
@@ -195,13 +727,481 @@ def complete_onboarding():
         if result.modified_count == 0:
             return jsonify({"error": "User not found"}), 404
         
+        audit_log.record(user_id, "user.onboarding_completed", "user", user_id, {"onboarding_complete": True})
+        
         return jsonify({"message": "Onboarding completed successfully"})
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Audit log
+class AuditLog:
+    """Write-behind audit trail stored in the ``audit_log`` collection.
+
+    Request threads only enqueue events. A background thread writes them
+    with ``insert_many`` once ``AUDIT_BATCH_SIZE`` events are waiting or
+    ``AUDIT_FLUSH_SECONDS`` have passed. Batches that cannot be written are
+    appended to a per-process spill file next to ``AUDIT_SPILL_PATH`` and
+    replayed after the next successful flush, or every
+    ``AUDIT_REPLAY_SECONDS`` while idle.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._replayed_at = 0.0
+
+    def record(self, actor_id, action, target_type, target_id, changes=None):
+        event = {
+            # Ids are assigned up front so a batch that is spilled after being
+            # partly written replays as duplicates instead of as new events
+            "_id": ObjectId(),
+            "actor_id": str(actor_id),
+            "action": action,
+            "target_type": target_type,
+            "target_id": str(target_id),
+            "changes": changes or {},
+            "ip": request.remote_addr if request else None,
+            "at": datetime.utcnow()
+        }
+        self._ensure_started()
+        try:
+            # Backpressure: a full queue slows the writer down a little
+            # before the event goes straight to the spill file
+            self._queue.put(event, timeout=AUDIT_ENQUEUE_TIMEOUT_SECONDS)
+        except queue.Full:
+            self._spill([event])
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + AUDIT_FLUSH_SECONDS
+        while len(batch) < AUDIT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self._insert(batch)
+        except Exception as e:
+            print(f"Audit log flush failed, spilling {len(batch)} events: {e}")
+            self._spill(batch)
+            return
+        self._replay_spill()
+
+    def _insert(self, events):
+        try:
+            db.audit_log.insert_many(events, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys mean the event was written by an earlier attempt
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    def _spill_path(self):
+        # One spill file per process, so workers never append to or rename
+        # each other's files
+        return f"{AUDIT_SPILL_PATH}.{os.getpid()}"
+
+    def _spill(self, events):
+        try:
+            with self._spill_lock:
+                with open(self._spill_path(), "a") as f:
+                    for event in events:
+                        f.write(json_util.dumps(event) + "\n")
+        except Exception as e:
+            print(f"Audit spill failed, dropping {len(events)} events: {e}")
+
+    def _owner_alive(self, path):
+        # Spill files are named <AUDIT_SPILL_PATH>.<pid>[.replay-<token>]
+        owner = path[len(AUDIT_SPILL_PATH) + 1:].split(".", 1)[0]
+        if not owner.isdigit():
+            return False
+        if int(owner) == os.getpid():
+            return False
+        try:
+            os.kill(int(owner), 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def _claim_spill_files(self):
+        """Rename every spill file this process may replay to a unique name.
+
+        That covers this process's own spill file, plus spill and replay files
+        left by processes that are no longer running (including the
+        un-suffixed file written by older versions). The rename is atomic,
+        so when two processes race for a file only one of them gets it.
+        """
+        own_spill = self._spill_path()
+        own_prefix = f"{AUDIT_SPILL_PATH}.{os.getpid()}.replay-"
+        directory = os.path.dirname(AUDIT_SPILL_PATH) or "."
+        base = os.path.basename(AUDIT_SPILL_PATH)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        claimed = []
+        for name in names:
+            if name != base and not name.startswith(base + "."):
+                continue
+            path = os.path.join(os.path.dirname(AUDIT_SPILL_PATH), name)
+            if path.startswith(own_prefix):
+                # Left over from an earlier replay of ours that was interrupted
+                claimed.append(path)
+                continue
+            if path != own_spill and path != AUDIT_SPILL_PATH and self._owner_alive(path):
+                continue
+            replay_path = own_prefix + secrets.token_hex(4)
+            try:
+                if path == own_spill:
+                    with self._spill_lock:
+                        os.rename(path, replay_path)
+                else:
+                    os.rename(path, replay_path)
+            except FileNotFoundError:
+                # Another process claimed it first
+                continue
+            claimed.append(replay_path)
+        return claimed
+
+    def _replay_spill(self):
+        self._replayed_at = time.monotonic()
+        try:
+            replay_paths = self._claim_spill_files()
+        except Exception as e:
+            print(f"Audit spill replay failed: {e}")
+            return
+        for replay_path in replay_paths:
+            try:
+                self._replay_file(replay_path)
+            except Exception as e:
+                print(f"Audit spill replay of {replay_path} failed: {e}")
+
+    def _replay_file(self, replay_path):
+        events = []
+        skipped = 0
+        with open(replay_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = json_util.loads(line)
+                    # Files spilled by older versions stored "at" as an ISO string and no _id
+                    if isinstance(event["at"], str):
+                        event["at"] = datetime.fromisoformat(event["at"])
+                except (ValueError, KeyError, TypeError):
+                    # A line torn by a crash mid-write cannot be recovered
+                    skipped += 1
+                    continue
+                events.append(event)
+        if skipped:
+            print(f"Skipped {skipped} malformed audit spill lines in {replay_path}")
+        for offset in range(0, len(events), AUDIT_BATCH_SIZE):
+            try:
+                self._insert(events[offset:offset + AUDIT_BATCH_SIZE])
+            except Exception:
+                self._spill(events[offset:])
+                break
+        os.remove(replay_path)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._next_batch()
+                if batch:
+                    self._write(batch)
+                elif time.monotonic() - self._replayed_at >= AUDIT_REPLAY_SECONDS:
+                    # Quiet periods still retry anything spilled during an outage
+                    self._replay_spill()
+            except Exception as e:
+                # Never let one bad batch or spill file stop the writer thread
+                print(f"Audit writer error: {e}")
+
+    def close(self):
+        # Called at interpreter exit so queued events are not lost on shutdown
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(AUDIT_FLUSH_SECONDS * 2)
+        remaining = self._drain()
+        for offset in range(0, len(remaining), AUDIT_BATCH_SIZE):
+            self._write(remaining[offset:offset + AUDIT_BATCH_SIZE])
+
+audit_log = AuditLog()
+atexit.register(audit_log.close)
+
+@on_startup
+def ensure_audit_indexes():
+    db.audit_log.create_index([("target_type", ASCENDING), ("target_id", ASCENDING), ("at", ASCENDING)])
+    db.audit_log.create_index([("actor_id", ASCENDING), ("at", ASCENDING)])
+
+# Idempotent writes
+class IdempotencyCache:
+    """Small in-process LRU in front of the ``idempotency_keys`` collection."""
+
+    def __init__(self, size):
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires"] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["record"]
+
+    def put(self, key, record):
+        with self._lock:
+            self._entries[key] = {"record": record, "expires": time.monotonic() + IDEMPOTENCY_TTL_SECONDS}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE)
+_idempotency_inflight = {}
+_idempotency_inflight_lock = threading.Lock()
+
+@on_startup
+def ensure_idempotency_indexes():
+    db.idempotency_keys.create_index([("created_at", ASCENDING)], expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+
+def replay_response(record):
+    response = app.response_class(record["body"], status=record["status"], mimetype=record["mimetype"])
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def replay_cached(stored, request_hash):
+    if stored["request_hash"] != request_hash:
+        return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+    return replay_response(stored["response"])
+
+def idempotency_wait_deadline():
+    # Waiting must end while the request's Mongo deadline still has room to
+    # answer, otherwise the polling itself would raise a driver timeout
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    request_deadline = g.get('request_deadline')
+    if request_deadline is not None:
+        deadline = min(deadline, request_deadline - IDEMPOTENCY_DEADLINE_MARGIN_SECONDS)
+    return deadline
+
+def still_in_progress():
+    return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+
+def claim_idempotency_key(key, request_hash):
+    try:
+        now = datetime.utcnow()
+        db.idempotency_keys.insert_one({
+            "_id": key,
+            "status": "in_progress",
+            "request_hash": request_hash,
+            "claimed_at": now,
+            "created_at": now
+        })
+        return True
+    except DuplicateKeyError:
+        return False
+
+def take_over_stale_claim(stored):
+    if stored["claimed_at"] > datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS):
+        return False
+    # Only one waiter can move the lease forward from the value it saw
+    result = db.idempotency_keys.update_one(
+        {"_id": stored["_id"], "status": "in_progress", "claimed_at": stored["claimed_at"]},
+        {"$set": {"claimed_at": datetime.utcnow()}}
+    )
+    return result.modified_count == 1
+
+def wait_for_stored_response(key, request_hash):
+    """Wait for another request holding ``key``.
+
+    Returns the response to send, or ``True`` once this request owns the
+    key, either because the holder released it or because its lease ran out.
+    """
+    deadline = idempotency_wait_deadline()
+    try:
+        while True:
+            stored = db.idempotency_keys.find_one({"_id": key})
+            if stored is None:
+                # The first attempt failed and released the key
+                if claim_idempotency_key(key, request_hash):
+                    return True
+                continue
+            if stored["request_hash"] != request_hash:
+                return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+            if stored["status"] == "done":
+                idempotency_cache.put(key, stored)
+                return replay_response(stored["response"])
+            if take_over_stale_claim(stored):
+                return True
+            if time.monotonic() + IDEMPOTENCY_POLL_SECONDS >= deadline:
+                return still_in_progress()
+            time.sleep(IDEMPOTENCY_POLL_SECONDS)
+    except PyMongoError as e:
+        if getattr(e, "timeout", False):
+            return still_in_progress()
+        raise
+
+class PendingIdempotencyRecords:
+    """Responses whose handler succeeded but whose record could not be stored.
+
+    The claim stays ``in_progress`` (retries get a 409) and a background
+    thread keeps writing the record every ``IDEMPOTENCY_STORE_RETRY_SECONDS``,
+    so it lands as soon as the database is back, well inside the lease.
+    Releasing the key instead would let a retry run the handler again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = {}
+        self._thread = None
+
+    def add(self, key, record):
+        with self._lock:
+            self._records[key] = (record, time.monotonic() + IDEMPOTENCY_TTL_SECONDS)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="idempotency-store")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(IDEMPOTENCY_STORE_RETRY_SECONDS)
+            with self._lock:
+                pending = list(self._records.items())
+            if not pending:
+                return
+            for key, (record, expires) in pending:
+                try:
+                    if time.monotonic() < expires:
+                        with pymongo.timeout(IDEMPOTENCY_STORE_RETRY_SECONDS):
+                            store_idempotent_response(key, record)
+                except PyMongoError:
+                    continue
+                with self._lock:
+                    self._records.pop(key, None)
+
+pending_idempotency_records = PendingIdempotencyRecords()
+
+def store_idempotent_response(key, record):
+    db.idempotency_keys.update_one({"_id": key}, {"$set": {"status": "done", "response": record}})
+
+def run_idempotent(func, key, request_hash, args, kwargs):
+    if not claim_idempotency_key(key, request_hash):
+        outcome = wait_for_stored_response(key, request_hash)
+        if outcome is not True:
+            return outcome
+    
+    try:
+        response = app.make_response(func(*args, **kwargs))
+    except Exception:
+        # Release the key so the client's retry runs the handler again
+        db.idempotency_keys.delete_one({"_id": key})
+        raise
+    
+    if response.status_code >= 500:
+        # Server errors are not final, so let the client retry for real
+        db.idempotency_keys.delete_one({"_id": key})
+        return response
+    
+    record = {
+        "status": response.status_code,
+        "body": response.get_data(as_text=True),
+        "mimetype": response.mimetype
+    }
+    # Cached first, so retries in this process replay it whatever happens next
+    idempotency_cache.put(key, {"request_hash": request_hash, "response": record})
+    try:
+        store_idempotent_response(key, record)
+    except PyMongoError as e:
+        print(f"Storing idempotent response for {key} failed, retrying in the background: {e}")
+        pending_idempotency_records.add(key, record)
+    return response
+
+def run_idempotent_or_unavailable(func, key, request_hash, args, kwargs):
+    # Claiming and waiting talk to Mongo outside the handler's own try/except
+    try:
+        return run_idempotent(func, key, request_hash, args, kwargs)
+    except PyMongoError as e:
+        print(f"Idempotency key {key} unavailable: {e}")
+        return jsonify({"error": "Database temporarily unavailable"}), 503, {"Retry-After": str(CIRCUIT_OPEN_SECONDS)}
+
+def idempotent(func):
+    """Replay the stored response when a write is retried with the same Idempotency-Key.
+
+    Keys are scoped to the caller and the endpoint. Concurrent duplicates in
+    this process wait for the first one; duplicates in other processes wait
+    on the stored record.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        auth_header = request.headers.get('Authorization', '')
+        user_id = verify_token(auth_header.split(' ')[1]) if auth_header.startswith('Bearer ') else None
+        if not idempotency_key or not user_id:
+            return func(*args, **kwargs)
+        
+        key = f"{user_id}:{request.endpoint}:{idempotency_key}"
+        request_hash = hashlib.sha256(request.get_data() + repr(sorted(kwargs.items())).encode('utf-8')).hexdigest()
+        
+        cached = idempotency_cache.get(key)
+        if cached is not None:
+            return replay_cached(cached, request_hash)
+        
+        with _idempotency_inflight_lock:
+            leader = _idempotency_inflight.get(key)
+            if leader is None:
+                done = threading.Event()
+                _idempotency_inflight[key] = done
+        
+        if leader is not None:
+            leader.wait(max(idempotency_wait_deadline() - time.monotonic(), 0))
+            cached = idempotency_cache.get(key)
+            if cached is not None:
+                return replay_cached(cached, request_hash)
+            return run_idempotent_or_unavailable(func, key, request_hash, args, kwargs)
+        
+        try:
+            return run_idempotent_or_unavailable(func, key, request_hash, args, kwargs)
+        finally:
+            with _idempotency_inflight_lock:
+                _idempotency_inflight.pop(key, None)
+            done.set()
+    return wrapper
+
 # Appointment routes
 @app.route('/api/appointments', methods=['POST'])
+@idempotent
 def create_appointment():
     try:
         auth_header = request.headers.get('Authorization')
@@ -253,7 +1253,21 @@ def create_appointment():
             "created_at": datetime.utcnow()
         }
         
-        result = db.appointments.insert_one(appointment)
+        remind_at = reminder_time(data["date"], data["time"])
+        if remind_at:
+            appointment["remind_at"] = remind_at
+        
+        result = db.appointments.insert_one(appointment, session=request_session(user_id))
+        
+        if remind_at:
+            reminder_scheduler.schedule(result.inserted_id, remind_at)
+        
+        audit_log.record(user_id, "appointment.created", "appointment", result.inserted_id, {
+            "doctor_id": data["doctor_id"],
+            "date": data["date"],
+            "time": data["time"],
+            "status": "scheduled"
+        })
         
         return jsonify({
             "message": "Appointment scheduled successfully",
@@ -273,6 +1287,7 @@ def create_appointment():
 
 # Existing appointment schedule route (keeping for backward compatibility)
 @app.route('/api/appointments/schedule', methods=['POST'])
+@idempotent
 def schedule_appointment_legacy():
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
@@ -316,8 +1331,22 @@ def schedule_appointment_legacy():
         "created_at": datetime.utcnow()
     }
     
+    remind_at = reminder_time(data["date"], data["time"])
+    if remind_at:
+        appointment["remind_at"] = remind_at
+    
     # Insert into database
-    result = db.appointments.insert_one(appointment)
+    result = db.appointments.insert_one(appointment, session=request_session(patient_email))
+    
+    if remind_at:
+        reminder_scheduler.schedule(result.inserted_id, remind_at)
+    
+    audit_log.record(patient_email, "appointment.created", "appointment", result.inserted_id, {
+        "doctor": data["doctor"],
+        "date": data["date"],
+        "time": data["time"],
+        "status": "Scheduled"
+    })
     
     return jsonify({
         "message": "Appointment scheduled successfully",
@@ -351,7 +1380,7 @@ def get_users():
             return jsonify({"error": "Role parameter is required"}), 400
         
         # Find users by role
-        users = list(db.users.find({"role": role}))
+        users = list(routed_db().users.find({"role": role}))
         
         # Remove sensitive information and convert ObjectId to string
         for user in users:
@@ -363,6 +1392,134 @@ def get_users():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Doctor directory
+class DoctorDirectory:
+    """Projected, in-memory snapshot of all doctors with a sorted prefix index.
+
+    The snapshot is rebuilt only when the shared version counter in
+    ``db.counters`` moves past the version it was built from.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._latest_version = None
+        self._checked_at = 0.0
+        self._doctors = []
+        self._body = b"[]"
+        self._index = []
+
+    def invalidate(self, version):
+        with self._lock:
+            self._latest_version = version
+            self._checked_at = time.monotonic()
+
+    def _current_version(self):
+        now = time.monotonic()
+        if self._latest_version is None or now - self._checked_at >= DOCTOR_DIRECTORY_VERSION_CHECK_SECONDS:
+            counter = db.counters.find_one({"_id": "doctor_directory"})
+            self._latest_version = counter["version"] if counter else 0
+            self._checked_at = now
+        return self._latest_version
+
+    def _rebuild(self, version):
+        projection = {field: 1 for field in DOCTOR_DIRECTORY_FIELDS}
+        doctors = []
+        for doctor in db.users.find({"role": "doctor"}, projection).sort("name", 1):
+            entry = {"_id": str(doctor["_id"])}
+            for field in DOCTOR_DIRECTORY_FIELDS:
+                entry[field] = doctor.get(field, "")
+            doctors.append(entry)
+
+        # Every word of the name and specialty is indexed so "smi" finds "John Smith"
+        index = []
+        for position, doctor in enumerate(doctors):
+            words = set()
+            for field in ("name", "specialty"):
+                value = (doctor.get(field) or "").lower()
+                words.add(value)
+                words.update(value.split())
+            for word in words:
+                if word:
+                    index.append((word, position))
+        index.sort()
+
+        self._doctors = doctors
+        self._body = json.dumps(doctors).encode("utf-8")
+        self._index = index
+        self._version = version
+
+    def has_snapshot(self):
+        return self._version is not None
+
+    def snapshot(self):
+        with self._lock:
+            # Serve the last snapshot as-is while the database is unavailable
+            if mongo_breaker.is_open() and self._version is not None:
+                return self._version, self._body, self._doctors, self._index
+            version = self._current_version()
+            if version != self._version:
+                self._rebuild(version)
+            return self._version, self._body, self._doctors, self._index
+
+    def search(self, prefix, limit=DOCTOR_DIRECTORY_SEARCH_LIMIT):
+        version, _, doctors, index = self.snapshot()
+        prefix = prefix.lower().strip()
+        results = []
+        seen = set()
+        position = bisect_left(index, (prefix, -1))
+        while position < len(index) and len(results) < limit:
+            word, doctor_position = index[position]
+            if not word.startswith(prefix):
+                break
+            if doctor_position not in seen:
+                seen.add(doctor_position)
+                results.append(doctors[doctor_position])
+            position += 1
+        return version, results
+
+doctor_directory = DoctorDirectory()
+
+@app.route('/api/doctors', methods=['GET'])
+def get_doctors():
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        if mongo_breaker.is_open() and not doctor_directory.has_snapshot():
+            return jsonify({"error": "Database temporarily unavailable"}), 503, {"Retry-After": str(CIRCUIT_OPEN_SECONDS)}
+        
+        query = request.args.get('q', '').strip()
+        if query:
+            limit = request.args.get('limit', str(DOCTOR_DIRECTORY_SEARCH_LIMIT))
+            if not limit.isdigit() or int(limit) < 1:
+                return jsonify({"error": "Limit must be a positive integer"}), 400
+            limit = min(int(limit), 100)
+            version, doctors = doctor_directory.search(query, limit)
+            response = jsonify(doctors)
+        else:
+            version, body, _, _ = doctor_directory.snapshot()
+            etag = f'"doctors-{version}"'
+            if request.headers.get('If-None-Match') == etag:
+                return "", 304
+            response = app.response_class(body, mimetype='application/json')
+            response.headers['ETag'] = etag
+        
+        response.headers['X-Directory-Version'] = str(version)
+        if mongo_breaker.is_open():
+            response.headers['Warning'] = '110 - "Response is Stale"'
+        return response
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/appointments', methods=['GET'])
 def get_appointments():
     try:
@@ -388,13 +1545,19 @@ def get_appointments():
         elif user["role"] == "doctor":
             query["doctor_id"] = ObjectId(user_id)
         
-        # Get appointments
-        appointments = list(db.appointments.find(query))
+        # Get appointments, touching the archive only when asked to
+        read_db = routed_db()
+        session = request_session(user_id)
+        appointments = list(read_db.appointments.find(query, session=session))
+        if request.args.get('include_archived') == '1':
+            for appointment in read_db.appointments_archive.find(query, session=session):
+                appointment["archived"] = True
+                appointments.append(appointment)
         
         # Get related user information
         for appointment in appointments:
             # Get patient information
-            patient = db.users.find_one({"_id": appointment["patient_id"]})
+            patient = read_db.users.find_one({"_id": appointment["patient_id"]}, session=session)
             if patient:
                 appointment["patient"] = {
                     "id": str(patient["_id"]),
@@ -403,7 +1566,7 @@ def get_appointments():
                 }
             
             # Get doctor information
-            doctor = db.users.find_one({"_id": appointment["doctor_id"]})
+            doctor = read_db.users.find_one({"_id": appointment["doctor_id"]}, session=session)
             if doctor:
                 appointment["doctor"] = {
                     "id": str(doctor["_id"]),
@@ -421,8 +1584,248 @@ def get_appointments():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/appointments/<appointment_id>', methods=['PUT'])
-def update_appointment_status(appointment_id):
+# Appointment archiving
+@on_startup
+def ensure_appointment_indexes():
+    db.appointments.create_index([("patient_id", ASCENDING)])
+    db.appointments.create_index([("doctor_id", ASCENDING)])
+    db.appointments.create_index([("status", ASCENDING), ("date", ASCENDING)])
+    db.appointments_archive.create_index([("patient_id", ASCENDING)])
+    db.appointments_archive.create_index([("doctor_id", ASCENDING)])
+
+def archive_appointments_batch(cutoff_date):
+    """Move one batch of finished appointments dated before ``cutoff_date``.
+
+    Returns the number of appointments moved. Documents are copied before
+    they are deleted, and only deleted while they still match the copy, so
+    an update that lands in between keeps the appointment in place and the
+    next run archives the newer version over the stale copy.
+    """
+    batch = list(db.appointments.find({
+        "status": {"$in": TERMINAL_APPOINTMENT_STATUSES},
+        "date": {"$lt": cutoff_date}
+    }).limit(ARCHIVE_BATCH_SIZE))
+    if not batch:
+        return 0
+    
+    archived_at = datetime.utcnow()
+    try:
+        db.appointments_archive.bulk_write([
+            ReplaceOne({"_id": appointment["_id"]}, {**appointment, "archived_at": archived_at}, upsert=True)
+            for appointment in batch
+        ], ordered=False)
+    except BulkWriteError as e:
+        # Duplicate keys mean a concurrent run upserted the same document
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+    
+    result = db.appointments.delete_many({
+        "_id": {"$in": [appointment["_id"] for appointment in batch]},
+        "$or": [
+            {"_id": appointment["_id"], "$expr": {"$eq": ["$$ROOT", {"$literal": appointment}]}}
+            for appointment in batch
+        ]
+    })
+    return result.deleted_count
+
+def archive_old_appointments():
+    # Appointment dates are stored as ISO "YYYY-MM-DD" strings, so they compare lexically
+    cutoff_date = (datetime.utcnow() - timedelta(days=ARCHIVE_HORIZON_DAYS)).strftime("%Y-%m-%d")
+    total = 0
+    while True:
+        moved = archive_appointments_batch(cutoff_date)
+        total += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            return total
+
+def run_archiver():
+    while True:
+        try:
+            moved = archive_old_appointments()
+            if moved:
+                print(f"Archived {moved} appointments")
+        except Exception as e:
+            print(f"Appointment archiver failed: {e}")
+        time.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+@on_startup
+def start_archiver():
+    if ARCHIVER_ENABLED:
+        threading.Thread(target=run_archiver, name="appointment-archiver", daemon=True).start()
+
+# Appointment reminders
+class LogReminderSink:
+    def deliver(self, reminders):
+        for reminder in reminders:
+            print(f"Reminder for {reminder['patient_email']}: appointment {reminder['appointment_id']} on {reminder['date']} at {reminder['time']}")
+
+class FileReminderSink:
+    """Appends one JSON line per reminder; meant for local testing."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def deliver(self, reminders):
+        with open(self.path, "a") as f:
+            for reminder in reminders:
+                f.write(json.dumps(reminder) + "\n")
+
+def create_reminder_sink(spec):
+    if spec.startswith("file:"):
+        return FileReminderSink(spec[len("file:"):])
+    return LogReminderSink()
+
+def appointment_update(update_fields):
+    # Finished or cancelled appointments drop out of the reminder queue
+    update = {"$set": update_fields}
+    if update_fields.get("status") in TERMINAL_APPOINTMENT_STATUSES:
+        update["$unset"] = {"remind_at": ""}
+    return update
+
+def reminder_time(date, time_of_day):
+    """When to remind about an appointment, or None if it can't be parsed or is already past."""
+    for time_format in ("%H:%M", "%I:%M %p"):
+        try:
+            local_start = datetime.strptime(f"{date} {time_of_day}", f"%Y-%m-%d {time_format}")
+        except (TypeError, ValueError):
+            continue
+        # Stored and compared as naive UTC, like every other datetime here
+        starts_at = local_start.replace(tzinfo=CLINIC_TIMEZONE).astimezone(timezone.utc).replace(tzinfo=None)
+        # Nothing to remind about once the appointment has started
+        if starts_at <= datetime.utcnow():
+            return None
+        return starts_at - timedelta(minutes=REMINDER_LEAD_MINUTES)
+    return None
+
+class ReminderScheduler:
+    """Delivers appointment reminders from the indexed ``remind_at`` field.
+
+    Only the next ``REMINDER_WINDOW_SECONDS`` of due times are held in an
+    in-memory min-heap; the database stays authoritative. Reminders are
+    claimed with a conditional update before delivery, so several workers
+    can run this without sending anything twice.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.worker_id = secrets.token_hex(8)
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._window_end = None
+
+    def schedule(self, appointment_id, remind_at):
+        # Called by the write paths; anything beyond the window is picked up
+        # by the next refresh
+        with self._lock:
+            if self._window_end is not None and remind_at <= self._window_end:
+                heapq.heappush(self._heap, (remind_at, appointment_id))
+                self._wakeup.set()
+
+    def _refresh_window(self, now):
+        window_end = now + timedelta(seconds=REMINDER_WINDOW_SECONDS)
+        upcoming = db.appointments.find(
+            {"remind_at": {"$lte": window_end}},
+            {"remind_at": 1}
+        ).sort("remind_at", ASCENDING)
+        heap = [(appointment["remind_at"], appointment["_id"]) for appointment in upcoming]
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+            self._window_end = window_end
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < REMINDER_BATCH_SIZE:
+                due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def _claim(self, appointment_ids, now):
+        claim = f"{self.worker_id}:{secrets.token_hex(4)}"
+        db.appointments.update_many(
+            {
+                "_id": {"$in": appointment_ids},
+                "remind_at": {"$lte": now},
+                "$or": [
+                    {"reminder_claim": {"$exists": False}},
+                    {"reminder_claimed_at": {"$lt": now - timedelta(seconds=REMINDER_CLAIM_TIMEOUT_SECONDS)}}
+                ]
+            },
+            {"$set": {"reminder_claim": claim, "reminder_claimed_at": now}}
+        )
+        return claim, list(db.appointments.find({"reminder_claim": claim}))
+
+    def _deliver(self, claim, appointments):
+        patients = {
+            patient["_id"]: patient
+            for patient in db.users.find(
+                {"_id": {"$in": [appointment.get("patient_id") for appointment in appointments]}},
+                {"email": 1, "name": 1}
+            )
+        }
+        reminders = []
+        for appointment in appointments:
+            patient = patients.get(appointment.get("patient_id"), {})
+            reminders.append({
+                "appointment_id": str(appointment["_id"]),
+                "patient_id": str(appointment.get("patient_id", "")),
+                "patient_email": patient.get("email", appointment.get("patientEmail")),
+                "doctor_id": str(appointment.get("doctor_id", appointment.get("doctor", ""))),
+                "date": appointment["date"],
+                "time": appointment["time"]
+            })
+        self.sink.deliver(reminders)
+        db.appointments.update_many(
+            {"reminder_claim": claim},
+            {"$unset": {"remind_at": "", "reminder_claim": "", "reminder_claimed_at": ""}, "$set": {"reminder_sent_at": datetime.utcnow()}}
+        )
+
+    def run_once(self):
+        now = datetime.utcnow()
+        if self._window_end is None or now >= self._window_end - timedelta(seconds=REMINDER_POLL_SECONDS):
+            self._refresh_window(now)
+        
+        while True:
+            due = self._pop_due(now)
+            if not due:
+                break
+            claim, appointments = self._claim(due, now)
+            if appointments:
+                self._deliver(claim, appointments)
+        
+        with self._lock:
+            next_due = self._heap[0][0] if self._heap else None
+        sleep_seconds = REMINDER_POLL_SECONDS
+        if next_due is not None:
+            sleep_seconds = min(sleep_seconds, max((next_due - datetime.utcnow()).total_seconds(), 0))
+        return sleep_seconds
+
+    def run(self):
+        while True:
+            try:
+                sleep_seconds = self.run_once()
+            except Exception as e:
+                print(f"Reminder scheduler failed: {e}")
+                sleep_seconds = REMINDER_POLL_SECONDS
+            self._wakeup.wait(sleep_seconds)
+            self._wakeup.clear()
+
+reminder_scheduler = ReminderScheduler(create_reminder_sink(REMINDER_SINK))
+
+@on_startup
+def ensure_reminder_indexes():
+    db.appointments.create_index([("remind_at", ASCENDING)], sparse=True)
+    db.appointments.create_index([("reminder_claim", ASCENDING)], sparse=True)
+
+@on_startup
+def start_reminder_scheduler():
+    if REMINDERS_ENABLED:
+        threading.Thread(target=reminder_scheduler.run, name="reminder-scheduler", daemon=True).start()
+
+@app.route('/api/appointments/bulk', methods=['PUT'])
+@idempotent
+def bulk_update_appointment_status():
     try:
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
@@ -435,51 +1838,950 @@ def update_appointment_status(appointment_id):
             return jsonify({"error": "Invalid token"}), 401
         
         data = request.get_json()
-        update_fields = {}
-        
-        # Check which fields to update
-        if "status" in data:
-            update_fields["status"] = data["status"]
-        
-        if "doctor_notes" in data:
-            update_fields["doctor_notes"] = data["doctor_notes"]
-        
-        if not update_fields:
-            return jsonify({"error": "No fields to update provided"}), 400
+        updates = data.get("updates") if isinstance(data, dict) else None
+        if not isinstance(updates, list) or not updates:
+            return jsonify({"error": "A non-empty list of updates is required"}), 400
         
-        # Verify user has permission to update appointment
-        appointment = db.appointments.find_one({"_id": ObjectId(appointment_id)})
-        if not appointment:
-            return jsonify({"error": "Appointment not found"}), 404
+        if len(updates) > BULK_UPDATE_MAX_ITEMS:
+            return jsonify({"error": f"At most {BULK_UPDATE_MAX_ITEMS} updates per request"}), 400
         
         user = db.users.find_one({"_id": ObjectId(user_id)})
         if not user:
             return jsonify({"error": "User not found"}), 404
         
-        # Permission checks based on role
-        if user["role"] == "doctor":
-            if str(appointment["doctor_id"]) != user_id:
-                return jsonify({"error": "Unauthorized"}), 403
-        elif user["role"] == "patient":
-            if str(appointment["patient_id"]) != user_id:
-                return jsonify({"error": "Unauthorized"}), 403
-            # Patients can only cancel appointments, not add notes
-            if "doctor_notes" in update_fields:
-                return jsonify({"error": "Patients cannot add doctor notes"}), 403
-        
-        # Update appointment with allowed fields
+        results = [None] * len(updates)
+        pending = []
+        for position, item in enumerate(updates):
+            appointment_id = item.get("id") if isinstance(item, dict) else None
+            if not appointment_id or not ObjectId.is_valid(appointment_id):
+                results[position] = {"id": appointment_id, "error": "Invalid appointment id", "code": 400}
+                continue
+            
+            update_fields = {}
+            if "status" in item:
+                update_fields["status"] = item["status"]
+            if "doctor_notes" in item:
+                update_fields["doctor_notes"] = item["doctor_notes"]
+            
+            if not update_fields:
+                results[position] = {"id": appointment_id, "error": "No fields to update provided", "code": 400}
+                continue
+            
+            pending.append((position, ObjectId(appointment_id), update_fields))
+        
+        # Ownership for every appointment is checked with a single query
+        appointments = {
+            appointment["_id"]: appointment
+            for appointment in db.appointments.find(
+                {"_id": {"$in": [appointment_id for _, appointment_id, _ in pending]}},
+                {"patient_id": 1, "doctor_id": 1}
+            )
+        }
+        
+        operations = []
+        operation_positions = []
+        for position, appointment_id, update_fields in pending:
+            appointment = appointments.get(appointment_id)
+            if not appointment:
+                results[position] = {"id": str(appointment_id), "error": "Appointment not found", "code": 404}
+                continue
+            
+            # Same permission rules as update_appointment_status
+            if user["role"] == "doctor":
+                if str(appointment.get("doctor_id")) != user_id:
+                    results[position] = {"id": str(appointment_id), "error": "Unauthorized", "code": 403}
+                    continue
+            elif user["role"] == "patient":
+                if str(appointment.get("patient_id")) != user_id:
+                    results[position] = {"id": str(appointment_id), "error": "Unauthorized", "code": 403}
+                    continue
+                if "doctor_notes" in update_fields:
+                    results[position] = {"id": str(appointment_id), "error": "Patients cannot add doctor notes", "code": 403}
+                    continue
+            
+            operations.append(UpdateOne({"_id": appointment_id}, appointment_update(update_fields)))
+            operation_positions.append(position)
+            results[position] = {"id": str(appointment_id), "updated": True}
+        
+        if operations:
+            try:
+                db.appointments.bulk_write(operations, ordered=False, session=request_session(user_id))
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    position = operation_positions[error["index"]]
+                    results[position] = {"id": results[position]["id"], "error": error.get("errmsg", "Failed to update appointment"), "code": 500}
+        
+        for position, appointment_id, update_fields in pending:
+            if results[position].get("updated"):
+                audit_log.record(user_id, "appointment.updated", "appointment", appointment_id, update_fields)
+        
+        updated = sum(1 for result in results if result.get("updated"))
+        return jsonify({
+            "message": f"Updated {updated} of {len(updates)} appointments",
+            "results": results
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/appointments/<appointment_id>', methods=['PUT'])
+@idempotent
+def update_appointment_status(appointment_id):
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        data = request.get_json()
+        update_fields = {}
+        
+        # Check which fields to update
+        if "status" in data:
+            update_fields["status"] = data["status"]
+        
+        if "doctor_notes" in data:
+            update_fields["doctor_notes"] = data["doctor_notes"]
+        
+        if not update_fields:
+            return jsonify({"error": "No fields to update provided"}), 400
+        
+        # Verify user has permission to update appointment
+        appointment = db.appointments.find_one({"_id": ObjectId(appointment_id)})
+        if not appointment:
+            return jsonify({"error": "Appointment not found"}), 404
+        
+        user = db.users.find_one({"_id": ObjectId(user_id)})
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        
+        # Permission checks based on role
+        if user["role"] == "doctor":
+            if str(appointment["doctor_id"]) != user_id:
+                return jsonify({"error": "Unauthorized"}), 403
+        elif user["role"] == "patient":
+            if str(appointment["patient_id"]) != user_id:
+                return jsonify({"error": "Unauthorized"}), 403
+            # Patients can only cancel appointments, not add notes
+            if "doctor_notes" in update_fields:
+                return jsonify({"error": "Patients cannot add doctor notes"}), 403
+        
+        # Update appointment with allowed fields
         result = db.appointments.update_one(
             {"_id": ObjectId(appointment_id)},
-            {"$set": update_fields}
+            appointment_update(update_fields),
+            session=request_session(user_id)
         )
         
-        if result.modified_count == 0:
+        # Setting the values it already has still counts as a success
+        if result.matched_count == 0:
             return jsonify({"error": "Failed to update appointment"}), 500
         
+        audit_log.record(user_id, "appointment.updated", "appointment", appointment_id, update_fields)
+        
         return jsonify({"message": "Appointment updated successfully"})
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Dashboard bootstrap
+bootstrap_executor = ThreadPoolExecutor(max_workers=BOOTSTRAP_WORKERS, thread_name_prefix="bootstrap")
+
+def submit_in_context(func, *args):
+    # Workers run in a copy of the request's context so they share its Mongo deadline
+    return bootstrap_executor.submit(contextvars.copy_context().run, func, *args)
+
+def load_upcoming_appointments(read_db, session, query, window_days):
+    # Appointment dates are the clinic's calendar days
+    today = clinic_now().strftime("%Y-%m-%d")
+    last_day = (clinic_now() + timedelta(days=window_days)).strftime("%Y-%m-%d")
+    query = {
+        **query,
+        "date": {"$gte": today, "$lte": last_day},
+        "status": {"$nin": TERMINAL_APPOINTMENT_STATUSES}
+    }
+    appointments = list(
+        read_db.appointments.find(query, {"remind_at": 0, "reminder_claim": 0, "reminder_claimed_at": 0}, session=session)
+        .sort([("date", ASCENDING), ("time", ASCENDING)])
+        .limit(BOOTSTRAP_APPOINTMENT_LIMIT)
+    )
+    
+    # One lookup for every patient and doctor in the window
+    participant_ids = {appointment.get("patient_id") for appointment in appointments}
+    participant_ids |= {appointment.get("doctor_id") for appointment in appointments}
+    participants = {
+        participant["_id"]: participant
+        for participant in read_db.users.find(
+            {"_id": {"$in": [participant_id for participant_id in participant_ids if participant_id]}},
+            {"name": 1, "email": 1},
+            session=session
+        )
+    }
+    
+    for appointment in appointments:
+        for field, key in (("patient_id", "patient"), ("doctor_id", "doctor")):
+            participant = participants.get(appointment.get(field))
+            if participant:
+                appointment[key] = {
+                    "id": str(participant["_id"]),
+                    "name": participant["name"],
+                    "email": participant["email"]
+                }
+            if field in appointment:
+                appointment[field] = str(appointment[field])
+        appointment["_id"] = str(appointment["_id"])
+    return appointments
+
+def load_doctor_directory():
+    if mongo_breaker.is_open() and not doctor_directory.has_snapshot():
+        return None, None
+    version, body, _, _ = doctor_directory.snapshot()
+    return version, body
+
+@app.route('/api/dashboard/bootstrap', methods=['GET'])
+def get_dashboard_bootstrap():
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        # The directory is independent of the user, so start it right away
+        directory_future = submit_in_context(load_doctor_directory)
+        
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        
+        # Same visibility rules as get_appointments
+        query = {}
+        if user["role"] == "patient":
+            query["patient_id"] = ObjectId(user_id)
+        elif user["role"] == "doctor":
+            query["doctor_id"] = ObjectId(user_id)
+        
+        window_days = request.args.get('days', str(BOOTSTRAP_WINDOW_DAYS))
+        if not window_days.isdigit():
+            return jsonify({"error": "Days must be a non-negative integer"}), 400
+        window_days = min(int(window_days), 90)
+        appointments_future = submit_in_context(
+            load_upcoming_appointments, routed_db(), request_session(user_id), query, window_days
+        )
+        
+        user["_id"] = str(user["_id"])
+        
+        # The directory is embedded as the snapshot's pre-serialized bytes, and
+        # left out entirely when the client already holds the current version
+        doctors_version, doctors_body = directory_future.result()
+        if doctors_body is None or request.args.get('doctors_version') == str(doctors_version):
+            doctors_body = b"null"
+        
+        head = app.json.dumps({
+            "profile": user,
+            "appointments": appointments_future.result(),
+            "doctors_version": doctors_version
+        })
+        body = head[:-1].encode('utf-8') + b', "doctors": ' + doctors_body + b'}'
+        return app.response_class(body, mimetype='application/json')
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Nurse patient monitoring
+@on_startup
+def ensure_nurse_indexes():
+    db.monitored_patients.create_index([("nurse_id", ASCENDING), ("room", ASCENDING)])
+    db.monitored_patients.create_index([("nurse_id", ASCENDING), ("status", ASCENDING), ("priority", ASCENDING)])
+    db.shift_stats.create_index([("created_at", ASCENDING)], expireAfterSeconds=SHIFT_STATS_RETENTION_DAYS * 24 * 3600)
+
+def clinic_now():
+    # Naive wall-clock time at the clinic, for anything shown or keyed by local time
+    return datetime.now(CLINIC_TIMEZONE).replace(tzinfo=None)
+
+def current_shift(now=None):
+    """Key of the shift ``now`` falls in, e.g. ``2024-03-01-07``.
+
+    ``now`` is clinic wall-clock time. The night shift that starts before
+    midnight keeps the previous day's date after midnight.
+    """
+    now = now or clinic_now()
+    started = [hour for hour in SHIFT_START_HOURS if hour <= now.hour]
+    if started:
+        return f"{now:%Y-%m-%d}-{started[-1]:02d}"
+    previous_day = now - timedelta(days=1)
+    return f"{previous_day:%Y-%m-%d}-{SHIFT_START_HOURS[-1]:02d}"
+
+def record_nurse_activity(nurse_id, patient_name, total_patients=0, patients_attending=0, note=None, medications=0):
+    # Running totals live in per-nurse and per-shift counter documents that are
+    # only ever $inc'ed, so reading them never depends on how many patients exist
+    gauges = {"totalPatients": total_patients, "patientsAttending": patients_attending}
+    gauges = {field: amount for field, amount in gauges.items() if amount}
+    if gauges:
+        db.nurse_stats.update_one({"_id": nurse_id}, {"$inc": gauges}, upsert=True)
+    
+    if not note and not medications:
+        return
+    
+    shift = current_shift()
+    update = {"$inc": {}, "$setOnInsert": {"nurse_id": nurse_id, "shift": shift, "created_at": datetime.utcnow()}}
+    if note:
+        update["$inc"]["notesTaken"] = 1
+        update["$push"] = {"recentNotes": {
+            "$each": [{"patientName": patient_name, "time": clinic_now().strftime("%H:%M"), "content": note}],
+            "$slice": -SHIFT_RECENT_NOTES
+        }}
+    if medications:
+        update["$inc"]["medicationsAdministered"] = medications
+    db.shift_stats.update_one({"_id": f"{nurse_id}:{shift}"}, update, upsert=True)
+
+def serialize_monitored_patient(patient):
+    patient["_id"] = str(patient["_id"])
+    patient["nurse_id"] = str(patient["nurse_id"])
+    return patient
+
+@app.route('/api/nurse/patients', methods=['GET'])
+def get_monitored_patients():
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+        if not user or user["role"] != "nurse":
+            return jsonify({"error": "Only nurses can monitor patients"}), 403
+        
+        patients = db.monitored_patients.find({"nurse_id": ObjectId(user_id)}).sort("room", ASCENDING)
+        return jsonify([serialize_monitored_patient(patient) for patient in patients])
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/nurse/patients', methods=['POST'])
+@idempotent
+def add_monitored_patient():
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+        if not user or user["role"] != "nurse":
+            return jsonify({"error": "Only nurses can monitor patients"}), 403
+        
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        # Validate types before anything is written, so counters never move
+        # for a patient that was not stored
+        if not all(isinstance(data.get(field, ""), str) for field in NURSE_PATIENT_FIELDS):
+            return jsonify({"error": "Patient fields must be strings"}), 400
+        
+        # Validate required fields
+        required_fields = ['name', 'room']
+        if not all(data.get(field, "").strip() for field in required_fields):
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        status = data.get("status", "Stable")
+        priority = data.get("priority", "Normal")
+        if status not in NURSE_PATIENT_STATUSES:
+            return jsonify({"error": "Invalid status"}), 400
+        if priority not in NURSE_PATIENT_PRIORITIES:
+            return jsonify({"error": "Invalid priority"}), 400
+        
+        now = datetime.utcnow()
+        patient = {
+            "nurse_id": ObjectId(user_id),
+            "name": data["name"].strip(),
+            "room": data["room"].strip(),
+            "status": status,
+            "priority": priority,
+            "notes": data.get("notes", ""),
+            "created_at": now,
+            "updated_at": now
+        }
+        
+        result = db.monitored_patients.insert_one(patient)
+        
+        record_nurse_activity(
+            user_id,
+            patient["name"],
+            total_patients=1,
+            patients_attending=1 if status == "Needs Attention" else 0,
+            note=patient["notes"].strip(),
+            medications=1 if data.get("medication") else 0
+        )
+        
+        patient["_id"] = result.inserted_id
+        return jsonify(serialize_monitored_patient(patient)), 201
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/nurse/patients/<patient_id>', methods=['PUT'])
+@idempotent
+def update_monitored_patient(patient_id):
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+        if not user or user["role"] != "nurse":
+            return jsonify({"error": "Only nurses can monitor patients"}), 403
+        
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({"error": "No fields to update provided"}), 400
+        
+        update_fields = {field: data[field] for field in NURSE_PATIENT_FIELDS if field in data}
+        
+        # Validate types before the update, so counters never drift from it
+        if not all(isinstance(value, str) for value in update_fields.values()):
+            return jsonify({"error": "Patient fields must be strings"}), 400
+        if any(not update_fields.get(field, "x").strip() for field in ("name", "room")):
+            return jsonify({"error": "Name and room cannot be empty"}), 400
+        
+        if "status" in update_fields and update_fields["status"] not in NURSE_PATIENT_STATUSES:
+            return jsonify({"error": "Invalid status"}), 400
+        if "priority" in update_fields and update_fields["priority"] not in NURSE_PATIENT_PRIORITIES:
+            return jsonify({"error": "Invalid priority"}), 400
+        
+        if not update_fields and not data.get("medication"):
+            return jsonify({"error": "No fields to update provided"}), 400
+        
+        update_fields["updated_at"] = datetime.utcnow()
+        
+        # The previous version tells us which counters this change moves
+        previous = db.monitored_patients.find_one_and_update(
+            {"_id": ObjectId(patient_id), "nurse_id": ObjectId(user_id)},
+            {"$set": update_fields},
+            return_document=ReturnDocument.BEFORE
+        )
+        
+        if not previous:
+            return jsonify({"error": "Patient not found"}), 404
+        
+        status = update_fields.get("status", previous["status"])
+        was_attending = previous["status"] == "Needs Attention"
+        is_attending = status == "Needs Attention"
+        notes = update_fields.get("notes", previous.get("notes", ""))
+        
+        record_nurse_activity(
+            user_id,
+            update_fields.get("name", previous["name"]),
+            patients_attending=int(is_attending) - int(was_attending),
+            note=notes.strip() if notes != previous.get("notes", "") else None,
+            medications=1 if data.get("medication") else 0
+        )
+        
+        return jsonify({"message": "Patient updated successfully"})
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/nurse/shift-stats', methods=['GET'])
+def get_shift_stats():
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+        if not user or user["role"] != "nurse":
+            return jsonify({"error": "Only nurses can view shift statistics"}), 403
+        
+        nurse_stats = db.nurse_stats.find_one({"_id": user_id}) or {}
+        shift_stats = db.shift_stats.find_one({"_id": f"{user_id}:{current_shift()}"}) or {}
+        
+        return jsonify({
+            "shift": current_shift(),
+            "stats": {
+                "totalPatients": nurse_stats.get("totalPatients", 0),
+                "patientsAttending": nurse_stats.get("patientsAttending", 0),
+                "notesTaken": shift_stats.get("notesTaken", 0),
+                "medicationsAdministered": shift_stats.get("medicationsAdministered", 0)
+            },
+            "notes": list(reversed(shift_stats.get("recentNotes", [])))
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Patient vitals
+@on_startup
+def ensure_vitals_indexes():
+    db.vitals_buckets.create_index([("patient_id", ASCENDING), ("metric", ASCENDING), ("start", ASCENDING)])
+
+def parse_timestamp(value):
+    # Naive UTC, like every other datetime this app stores
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def floor_time(moment, seconds):
+    epoch = int(moment.replace(tzinfo=timezone.utc).timestamp())
+    return datetime.utcfromtimestamp(epoch - epoch % seconds)
+
+def vitals_bucket_updates(patient_id, samples):
+    """Turn a batch of samples into bucket upserts.
+
+    Samples go into hourly buckets holding at most ``VITALS_BUCKET_SIZE``
+    samples each. Every bucket also keeps running min/max/sum/count, so
+    coarse queries never have to read the samples themselves.
+    """
+    grouped = {}
+    for sample in samples:
+        key = (sample["metric"], floor_time(sample["ts"], VITALS_BUCKET_SECONDS))
+        grouped.setdefault(key, []).append(sample)
+    
+    operations = []
+    for (metric, start), group in grouped.items():
+        for offset in range(0, len(group), VITALS_BUCKET_SIZE):
+            chunk = group[offset:offset + VITALS_BUCKET_SIZE]
+            values = [sample["value"] for sample in chunk]
+            # A full bucket no longer matches, so the upsert opens a new one
+            operations.append(UpdateOne(
+                {
+                    "patient_id": patient_id,
+                    "metric": metric,
+                    "start": start,
+                    "count": {"$lte": VITALS_BUCKET_SIZE - len(chunk)}
+                },
+                {
+                    "$push": {"samples": {"$each": chunk}},
+                    "$inc": {"count": len(chunk), "sum": sum(values)},
+                    "$min": {"min": min(values)},
+                    "$max": {"max": max(values)}
+                },
+                upsert=True
+            ))
+    return operations
+
+def downsample_vitals(buckets, start, end, interval):
+    points = {}
+    
+    def add(moment, count, total, low, high):
+        key = floor_time(moment, interval)
+        point = points.setdefault(key, {"count": 0, "sum": 0, "min": low, "max": high})
+        point["count"] += count
+        point["sum"] += total
+        point["min"] = min(point["min"], low)
+        point["max"] = max(point["max"], high)
+    
+    for bucket in buckets:
+        if "samples" not in bucket:
+            add(bucket["start"], bucket["count"], bucket["sum"], bucket["min"], bucket["max"])
+            continue
+        for sample in bucket["samples"]:
+            if start <= sample["ts"] < end:
+                add(sample["ts"], 1, sample["value"], sample["value"], sample["value"])
+    
+    return [
+        {
+            "t": moment.isoformat() + "Z",
+            "min": point["min"],
+            "max": point["max"],
+            "avg": point["sum"] / point["count"],
+            "count": point["count"]
+        }
+        for moment, point in sorted(points.items())
+    ]
+
+@app.route('/api/nurse/patients/<patient_id>/vitals', methods=['POST'])
+@idempotent
+def record_vitals(patient_id):
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        patient = db.monitored_patients.find_one({"_id": ObjectId(patient_id), "nurse_id": ObjectId(user_id)}, {"_id": 1})
+        if not patient:
+            return jsonify({"error": "Patient not found"}), 404
+        
+        data = request.get_json()
+        raw_samples = data.get("samples") if isinstance(data, dict) else None
+        if not isinstance(raw_samples, list) or not raw_samples:
+            return jsonify({"error": "A non-empty list of samples is required"}), 400
+        
+        if len(raw_samples) > VITALS_MAX_BATCH:
+            return jsonify({"error": f"At most {VITALS_MAX_BATCH} samples per request"}), 400
+        
+        now = datetime.utcnow()
+        samples = []
+        for raw in raw_samples:
+            # JSON true/false arrive as bool, which is a subclass of int
+            value = raw.get("value") if isinstance(raw, dict) else None
+            if not isinstance(raw, dict) or not raw.get("metric") or not isinstance(value, (int, float)) or isinstance(value, bool):
+                return jsonify({"error": "Each sample needs a metric and a numeric value"}), 400
+            if raw.get("ts") and not isinstance(raw["ts"], str):
+                return jsonify({"error": "Sample timestamps must be ISO 8601 strings"}), 400
+            sample = {
+                "metric": str(raw["metric"]),
+                "value": raw["value"],
+                "ts": parse_timestamp(raw["ts"]) if raw.get("ts") else now
+            }
+            if raw.get("note"):
+                sample["note"] = str(raw["note"])
+            samples.append(sample)
+        
+        operations = vitals_bucket_updates(patient["_id"], samples)
+        db.vitals_buckets.bulk_write(operations, ordered=True)
+        
+        return jsonify({"message": f"Recorded {len(samples)} samples"}), 201
+        
+    except ValueError:
+        return jsonify({"error": "Invalid timestamp"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/nurse/patients/<patient_id>/vitals', methods=['GET'])
+def get_vitals(patient_id):
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        patient = db.monitored_patients.find_one({"_id": ObjectId(patient_id), "nurse_id": ObjectId(user_id)}, {"_id": 1})
+        if not patient:
+            return jsonify({"error": "Patient not found"}), 404
+        
+        metric = request.args.get('metric')
+        if not metric:
+            return jsonify({"error": "Metric parameter is required"}), 400
+        
+        end = parse_timestamp(request.args['to']) if request.args.get('to') else datetime.utcnow()
+        start = parse_timestamp(request.args['from']) if request.args.get('from') else end - timedelta(hours=VITALS_DEFAULT_RANGE_HOURS)
+        interval = int(request.args.get('interval', VITALS_DEFAULT_INTERVAL_SECONDS))
+        if interval <= 0 or start >= end:
+            return jsonify({"error": "Invalid time range or interval"}), 400
+        if (end - start).total_seconds() / interval > VITALS_MAX_POINTS:
+            return jsonify({"error": "Interval too small for this time range"}), 400
+        
+        query = {"patient_id": patient["_id"], "metric": metric}
+        span = timedelta(seconds=VITALS_BUCKET_SECONDS)
+        if interval % VITALS_BUCKET_SECONDS == 0:
+            # Buckets fully inside the range contribute their summaries only;
+            # samples are read just for the partial buckets at either edge
+            buckets = list(db.vitals_buckets.find(
+                {**query, "start": {"$gte": start, "$lte": end - span}},
+                {"samples": 0}
+            ))
+            buckets += db.vitals_buckets.find({**query, "$or": [
+                {"start": {"$gt": start - span, "$lt": start}},
+                {"start": {"$gt": end - span, "$lt": end}}
+            ]})
+        else:
+            buckets = db.vitals_buckets.find({**query, "start": {"$gt": start - span, "$lt": end}})
+        
+        return jsonify({
+            "metric": metric,
+            "interval": interval,
+            "points": downsample_vitals(buckets, start, end, interval)
+        })
+        
+    except ValueError:
+        return jsonify({"error": "Invalid time range or interval"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Request profiling
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval.
+
+    Runs in its own thread so the profiled code is not instrumented; the
+    result is written as a speedscope "sampled" profile.
+    """
+
+    def __init__(self, thread_id, interval=PROFILING_SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def to_speedscope(self, name, wall_seconds):
+        frames = []
+        frame_index = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            sample = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                sample.append(frame_index[frame])
+            samples.append(sample)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "hospivibe",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": wall_seconds,
+                "samples": samples,
+                "weights": weights
+            }]
+        }
+
+def sign_profiling_token(expires: int) -> str:
+    signature = hmac.new(PROFILING_SECRET.encode('utf-8'), f"profile:{expires}".encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+def verify_profiling_token(token: str) -> bool:
+    try:
+        expires = int(token.split('.', 1)[0])
+    except ValueError:
+        return False
+    return expires > time.time() and hmac.compare_digest(token, sign_profiling_token(expires))
+
+class ProfilingSampleRates:
+    """Per-endpoint sample rates shared by all worker processes.
+
+    ``PROFILING_SAMPLE_RATES`` gives the defaults. Overrides set through the
+    admin API live in the ``profiling_sampling`` document of ``db.settings``
+    and are re-read at most every ``PROFILING_SAMPLING_REFRESH_SECONDS``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates = dict(PROFILING_SAMPLE_RATES)
+        self._loaded_at = None
+
+    def _load(self):
+        settings = db.settings.find_one({"_id": "profiling_sampling"}) or {}
+        rates = {**PROFILING_SAMPLE_RATES, **settings.get("rates", {})}
+        # A stored 0 switches off an endpoint that has a default rate
+        return {endpoint: rate for endpoint, rate in rates.items() if rate > 0}
+
+    def current(self, refresh=False):
+        with self._lock:
+            now = time.monotonic()
+            if refresh or self._loaded_at is None or now - self._loaded_at >= PROFILING_SAMPLING_REFRESH_SECONDS:
+                try:
+                    self._rates = self._load()
+                except PyMongoError as e:
+                    # Keep sampling with the last known rates
+                    print(f"Loading profiling sample rates failed: {e}")
+                self._loaded_at = now
+            return self._rates
+
+    def set(self, endpoint, rate):
+        db.settings.update_one(
+            {"_id": "profiling_sampling"},
+            {"$set": {f"rates.{endpoint}": rate}},
+            upsert=True
+        )
+        return self.current(refresh=True)
+
+profiling_sample_rates = ProfilingSampleRates()
+
+def should_profile_request():
+    token = request.headers.get('X-Profile-Token')
+    if token:
+        return verify_profiling_token(token)
+    rate = profiling_sample_rates.current().get(request.endpoint, 0)
+    return rate > 0 and random.random() < rate
+
+def start_request_profile():
+    if not should_profile_request():
+        return
+    mongo_wait_listener.local.active = True
+    mongo_wait_listener.local.wait_micros = 0
+    mongo_wait_listener.local.commands = 0
+    sampler = StackSampler(threading.get_ident())
+    g.profile = {
+        "sampler": sampler,
+        "wall_start": time.perf_counter(),
+        "cpu_start": time.thread_time(),
+        "blocks_start": sys.getallocatedblocks(),
+        "gc_start": sum(stat["collections"] for stat in gc.get_stats())
+    }
+    sampler.start()
+
+def finish_request_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    
+    wall = time.perf_counter() - profile["wall_start"]
+    cpu = time.thread_time() - profile["cpu_start"]
+    profile["sampler"].stop()
+    mongo_wait_listener.local.active = False
+    mongo_wait = mongo_wait_listener.local.wait_micros / 1e6
+    
+    name = f"{request.endpoint}-{datetime.utcnow():%Y%m%dT%H%M%S}-{secrets.token_hex(3)}"
+    os.makedirs(PROFILING_OUTPUT_DIR, exist_ok=True)
+    with open(os.path.join(PROFILING_OUTPUT_DIR, f"{name}.speedscope.json"), "w") as f:
+        json.dump(profile["sampler"].to_speedscope(name, wall), f)
+    
+    response.headers['Server-Timing'] = ", ".join([
+        f"wall;dur={wall * 1000:.2f}",
+        f"cpu;dur={cpu * 1000:.2f}",
+        f"mongo;dur={mongo_wait * 1000:.2f};desc=\"{mongo_wait_listener.local.commands} commands\""
+    ])
+    response.headers['X-Profile-Id'] = name
+    # Both counters are process-wide: they cover everything the process did
+    # while this request ran, including concurrent requests, so they are
+    # labelled as such rather than passed off as this request's allocations
+    response.headers['X-Profile-Process-Net-Allocated-Blocks'] = str(sys.getallocatedblocks() - profile["blocks_start"])
+    response.headers['X-Profile-Process-GC-Collections'] = str(sum(stat["collections"] for stat in gc.get_stats()) - profile["gc_start"])
+    return response
+
+def discard_request_profile(exc):
+    # Only reached with a live sampler if after_request never ran
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile["sampler"].stop()
+        mongo_wait_listener.local.active = False
+
+if PROFILING_ENABLED:
+    app.before_request(start_request_profile)
+    app.after_request(finish_request_profile)
+    app.teardown_request(discard_request_profile)
+
+@app.route('/api/admin/profiling/token', methods=['POST'])
+def create_profiling_token():
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        if not PROFILING_ENABLED:
+            return jsonify({"error": "Profiling is disabled"}), 404
+        
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+        if not user or user["role"] != "admin":
+            return jsonify({"error": "Only admins can profile requests"}), 403
+        
+        expires = int(time.time()) + PROFILING_TOKEN_TTL_SECONDS
+        return jsonify({"header": "X-Profile-Token", "token": sign_profiling_token(expires), "expires": expires})
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/profiling/sampling', methods=['PUT'])
+def update_profiling_sampling():
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Invalid token"}), 401
+        
+        token = auth_header.split(' ')[1]
+        user_id = verify_token(token)
+        
+        if not user_id:
+            return jsonify({"error": "Invalid token"}), 401
+        
+        if not PROFILING_ENABLED:
+            return jsonify({"error": "Profiling is disabled"}), 404
+        
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+        if not user or user["role"] != "admin":
+            return jsonify({"error": "Only admins can profile requests"}), 403
+        
+        data = request.get_json()
+        if not data or "endpoint" not in data or "rate" not in data:
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        if data["endpoint"] not in app.view_functions:
+            return jsonify({"error": "Unknown endpoint"}), 400
+        
+        try:
+            rate = float(data["rate"]) if not isinstance(data["rate"], bool) else None
+        except (TypeError, ValueError):
+            rate = None
+        if rate is None or not 0 <= rate <= 1:
+            return jsonify({"error": "Rate must be a number between 0 and 1"}), 400
+        
+        # Stored in Mongo so every worker process applies it, not just this one
+        rates = profiling_sample_rates.set(data["endpoint"], rate)
+        return jsonify({
+            "sampling": rates,
+            "applies_to_all_workers_within_seconds": PROFILING_SAMPLING_REFRESH_SECONDS
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
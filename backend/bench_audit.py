@@ -0,0 +1,94 @@
+"""Compare a synchronous audit insert with the write-behind AuditLog path.
+
+Run against the database the app is configured for:
+
+    MONGODB_URI="mongodb://localhost:27017/" python bench_audit.py [events]
+
+Both runs write the same events into the ``audit_log`` collection of a
+scratch ``<database>_bench`` database, which is dropped afterwards. The
+sync run times each ``insert_one`` as a request thread would see it. The
+write-behind run times ``audit_log.record`` (the enqueue) and, separately,
+the time until the background writer has flushed everything.
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+os.environ.setdefault('ARCHIVER_ENABLED', '0')
+os.environ.setdefault('REMINDERS_ENABLED', '0')
+
+import app
+
+DEFAULT_EVENTS = 2000
+
+
+def make_event(number):
+    return {
+        "actor_id": "bench",
+        "action": "bench",
+        "target_type": "bench",
+        "target_id": str(number),
+        "changes": {"number": number},
+        "ip": None,
+        "at": datetime.utcnow()
+    }
+
+
+def summarize(label, latencies, total_seconds):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<22} p50 {p50:8.3f} ms  p99 {p99:8.3f} ms  "
+          f"{len(latencies) / total_seconds:10.0f} events/s")
+
+
+def bench_sync(collection, events):
+    latencies = []
+    started = time.perf_counter()
+    for number in range(events):
+        call_started = time.perf_counter()
+        collection.insert_one(make_event(number))
+        latencies.append(time.perf_counter() - call_started)
+    summarize("sync insert_one", latencies, time.perf_counter() - started)
+
+
+def bench_enqueue(collection, events):
+    # Point the writer at the scratch database for the duration of the run
+    real_db = app.db
+    app.db = collection.database
+    try:
+        latencies = []
+        started = time.perf_counter()
+        for number in range(events):
+            call_started = time.perf_counter()
+            app.audit_log.record("bench", "bench", "bench", number, {"number": number})
+            latencies.append(time.perf_counter() - call_started)
+        enqueued = time.perf_counter() - started
+        summarize("audit_log.record", latencies, enqueued)
+
+        while collection.count_documents({}) < events:
+            time.sleep(0.01)
+        flushed = time.perf_counter() - started
+        print(f"{'write-behind flushed':<22} {flushed * 1000:8.1f} ms total  "
+              f"{events / flushed:10.0f} events/s")
+    finally:
+        app.db = real_db
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EVENTS
+    bench_db = app.client[f"{app.db.name}_bench"]
+    collection = bench_db.audit_log
+    app.client.drop_database(bench_db.name)
+    try:
+        bench_sync(collection, events)
+        collection.drop()
+        bench_enqueue(collection, events)
+    finally:
+        app.client.drop_database(bench_db.name)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
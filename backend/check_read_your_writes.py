@@ -0,0 +1,79 @@
+"""Check read-your-writes against a local three-member replica set.
+
+Start the replica set (one host, three ports) and run the check:
+
+    mkdir -p /tmp/rs0-0 /tmp/rs0-1 /tmp/rs0-2
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 --fork --logpath /tmp/rs0-0.log
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 --fork --logpath /tmp/rs0-1.log
+    mongod --replSet rs0 --port 27019 --dbpath /tmp/rs0-2 --fork --logpath /tmp/rs0-2.log
+    mongosh --port 27017 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"},
+        {_id: 1, host: "localhost:27018"},
+        {_id: 2, host: "localhost:27019"}]})'
+    MONGODB_URI="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0" \\
+        python check_read_your_writes.py
+
+The patient's appointment list is read from a secondary. Between the
+booking and each read, the in-process write-time map is cleared, to act as
+if the read had landed on another worker process. The X-Causal-Token header
+alone must then be enough for the read to see the booking.
+"""
+import os
+import secrets
+import sys
+
+os.environ.setdefault('ARCHIVER_ENABLED', '0')
+os.environ.setdefault('REMINDERS_ENABLED', '0')
+os.environ['APPOINTMENTS_READ_PREFERENCE'] = 'secondaryPreferred'
+
+import app
+
+ROUNDS = 20
+
+
+def register(client, role):
+    suffix = secrets.token_hex(4)
+    response = client.post('/api/auth/register', json={
+        "name": f"Check {role} {suffix}",
+        "email": f"check-{role}-{suffix}@example.com",
+        "password": "check12345",
+        "role": role
+    })
+    data = response.get_json()
+    return data["user"]["id"], {"Authorization": f"Bearer {data['access_token']}"}
+
+
+def main():
+    client = app.app.test_client()
+    doctor_id, _ = register(client, "doctor")
+    _, patient_headers = register(client, "patient")
+
+    failures = 0
+    for round_number in range(ROUNDS):
+        booking = client.post('/api/appointments', headers=patient_headers, json={
+            "doctor_id": doctor_id,
+            "date": "2099-01-01",
+            "time": f"{round_number:02d}:00",
+            "reason": "read-your-writes check"
+        })
+        if booking.status_code != 201:
+            print(f"Booking failed: {booking.status_code} {booking.get_json()}")
+            return 1
+        appointment_id = booking.get_json()["appointment"]["id"]
+
+        with app._causal_times_lock:
+            app._causal_times.clear()
+
+        listing = client.get('/api/appointments', headers={
+            **patient_headers,
+            "X-Causal-Token": booking.headers.get('X-Causal-Token', '')
+        })
+        if appointment_id not in {appointment["_id"] for appointment in listing.get_json()}:
+            failures += 1
+
+    print(f"{ROUNDS - failures}/{ROUNDS} bookings visible on the next read")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
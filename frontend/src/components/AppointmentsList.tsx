@@ -3,6 +3,7 @@ import { useToast } from '@/components/ui/use-toast';
 import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import { Calendar, Clock, User, X } from 'lucide-react';
+import { apiFetch } from '@/lib/api';
 
 interface Doctor {
   id: string;
@@ -37,9 +38,10 @@ const AppointmentsList: React.FC = () => {
       const token = localStorage.getItem('token');
       if (!token) throw new Error('Authentication required');
 
-      const response = await fetch('http://127.0.0.1:5000/api/appointments', {
+      const response = await apiFetch('http://127.0.0.1:5000/api/appointments', {
         headers: {
-          'Authorization': `Bearer ${token}`
+          'Authorization': `Bearer ${token}`,
+          'X-Causal-Token': localStorage.getItem('causal_token') || ''
         }
       });
 
@@ -69,7 +71,7 @@ const AppointmentsList: React.FC = () => {
       const token = localStorage.getItem('token');
       if (!token) throw new Error('Authentication required');
 
-      const response = await fetch(`http://127.0.0.1:5000/api/appointments/${appointmentId}`, {
+      const response = await apiFetch(`http://127.0.0.1:5000/api/appointments/${appointmentId}`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
@@ -78,6 +80,9 @@ const AppointmentsList: React.FC = () => {
         body: JSON.stringify({ status: 'cancelled' })
       });
 
+      const causalToken = response.headers.get('X-Causal-Token');
+      if (causalToken) localStorage.setItem('causal_token', causalToken);
+
       if (!response.ok) {
         throw new Error('Failed to cancel appointment');
       }
@@ -4,11 +4,13 @@ import { Button } from '@/components/ui/button';
 import { Label } from '@/components/ui/label';
 import { Input } from '@/components/ui/input';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
+import { apiFetch, loadCachedDoctors, storeCachedDoctors } from '@/lib/api';
 
 interface Doctor {
   _id: string;
   name: string;
   email: string;
+  specialty?: string;
 }
 
 interface ScheduleAppointmentFormProps {
@@ -27,24 +29,34 @@ const ScheduleAppointmentForm: React.FC<ScheduleAppointmentFormProps> = ({ onApp
   });
 
   useEffect(() => {
+    // Show the directory cached by the dashboard right away, then revalidate it
+    const cached = loadCachedDoctors();
+    if (cached) setDoctors(cached.doctors);
+
     const fetchDoctors = async () => {
       try {
         const token = localStorage.getItem('token');
         if (!token) throw new Error('Authentication required');
 
-        const response = await fetch('http://127.0.0.1:5000/api/users?role=doctor', {
+        const response = await apiFetch('http://127.0.0.1:5000/api/doctors', {
           headers: {
-            'Authorization': `Bearer ${token}`
+            'Authorization': `Bearer ${token}`,
+            ...(cached ? { 'If-None-Match': `"doctors-${cached.version}"` } : {})
           }
         });
 
+        if (response.status === 304) return;
+
         if (!response.ok) {
           throw new Error('Failed to fetch doctors');
         }
 
         const data = await response.json();
         setDoctors(data);
+        const version = response.headers.get('X-Directory-Version');
+        if (version) storeCachedDoctors(version, data);
       } catch (error) {
+        if (cached) return;
         toast({
           title: "Error",
           description: "Failed to load doctors list",
@@ -73,7 +85,7 @@ const ScheduleAppointmentForm: React.FC<ScheduleAppointmentFormProps> = ({ onApp
       const token = localStorage.getItem('token');
       if (!token) throw new Error('Authentication required');
 
-      const response = await fetch('http://127.0.0.1:5000/api/appointments', {
+      const response = await apiFetch('http://127.0.0.1:5000/api/appointments', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -82,6 +94,9 @@ const ScheduleAppointmentForm: React.FC<ScheduleAppointmentFormProps> = ({ onApp
         body: JSON.stringify(formData)
       });
 
+      const causalToken = response.headers.get('X-Causal-Token');
+      if (causalToken) localStorage.setItem('causal_token', causalToken);
+
       if (!response.ok) {
         const errorData = await response.json();
         throw new Error(errorData.error || 'Failed to schedule appointment');
@@ -124,7 +139,7 @@ const ScheduleAppointmentForm: React.FC<ScheduleAppointmentFormProps> = ({ onApp
           <SelectContent>
             {doctors.map((doctor) => (
               <SelectItem key={doctor._id} value={doctor._id}>
-                {doctor.name}
+                {doctor.specialty ? `${doctor.name} (${doctor.specialty})` : doctor.name}
               </SelectItem>
             ))}
           </SelectContent>
@@ -1,5 +1,6 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { SESSION_EXPIRED_EVENT, apiFetch, isTokenExpiring, refreshAccessToken } from '@/lib/api';
 
 export type UserRole = 'admin' | 'doctor' | 'nurse' | 'patient';
 
@@ -22,6 +23,9 @@ interface AuthContextType {
   completeOnboarding: () => Promise<void>;
 }
 
+// Refresh a little before the 30 minute access token lifetime runs out
+const TOKEN_REFRESH_INTERVAL_MS = 25 * 60 * 1000;
+
 const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
 export const useAuth = () => {
@@ -43,14 +47,45 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
     const storedUser = localStorage.getItem('user');
     const storedToken = localStorage.getItem('token');
     
-    if (storedUser && storedToken) {
-      setUser(JSON.parse(storedUser));
-      setOnboardingComplete(JSON.parse(storedUser).onboarding_complete);
-    }
-    
-    setIsLoading(false);
+    const restoreSession = async () => {
+      if (storedUser && storedToken) {
+        // After a reload the access token may have expired while the refresh token is still valid
+        if (isTokenExpiring(storedToken)) {
+          await refreshAccessToken();
+        }
+        if (localStorage.getItem('token')) {
+          setUser(JSON.parse(storedUser));
+          setOnboardingComplete(JSON.parse(storedUser).onboarding_complete);
+        }
+      }
+      
+      setIsLoading(false);
+    };
+
+    restoreSession();
   }, []);
 
+  useEffect(() => {
+    if (!user) return;
+
+    const handleSessionExpired = () => logout();
+    // Returning to a tab that was left open can also find the token expired
+    const handleVisibilityChange = () => {
+      if (document.visibilityState === 'visible' && isTokenExpiring(localStorage.getItem('token'))) {
+        refreshAccessToken();
+      }
+    };
+
+    const interval = setInterval(refreshAccessToken, TOKEN_REFRESH_INTERVAL_MS);
+    window.addEventListener(SESSION_EXPIRED_EVENT, handleSessionExpired);
+    document.addEventListener('visibilitychange', handleVisibilityChange);
+    return () => {
+      clearInterval(interval);
+      window.removeEventListener(SESSION_EXPIRED_EVENT, handleSessionExpired);
+      document.removeEventListener('visibilitychange', handleVisibilityChange);
+    };
+  }, [user]);
+
   const login = async (email: string, password: string, role: UserRole) => {
     try {
       setIsLoading(true);
@@ -74,6 +109,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       setUser(data.user);
       localStorage.setItem('user', JSON.stringify(data.user));
       localStorage.setItem('token', data.access_token);
+      localStorage.setItem('refresh_token', data.refresh_token);
       setOnboardingComplete(data.user.onboarding_complete);
       
       // Navigate based on onboarding status
@@ -113,6 +149,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       setUser(data.user);
       localStorage.setItem('user', JSON.stringify(data.user));
       localStorage.setItem('token', data.access_token);
+      localStorage.setItem('refresh_token', data.refresh_token);
       setOnboardingComplete(false);
       
       // Navigate to onboarding
@@ -126,9 +163,22 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      fetch('http://127.0.0.1:5000/api/auth/logout', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      }).catch((error) => console.error('Logout error:', error));
+    }
+
     setUser(null);
     localStorage.removeItem('user');
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
+    localStorage.removeItem('causal_token');
     navigate('/login');
   };
 
@@ -137,7 +187,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       const token = localStorage.getItem('token');
       if (!token) throw new Error('No authentication token found');
 
-      const response = await fetch('http://127.0.0.1:5000/api/user/onboarding', {
+      const response = await apiFetch('http://127.0.0.1:5000/api/user/onboarding', {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -0,0 +1,98 @@
+const API_URL = 'http://127.0.0.1:5000';
+
+// Refresh when less than this much of the access token's lifetime is left
+const TOKEN_EXPIRY_MARGIN_MS = 5 * 60 * 1000;
+
+export const SESSION_EXPIRED_EVENT = 'auth:session-expired';
+
+let refreshInFlight: Promise<string | null> | null = null;
+
+const tokenExpiresAt = (token: string): number | null => {
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return typeof payload.exp === 'number' ? payload.exp * 1000 : null;
+  } catch {
+    return null;
+  }
+};
+
+export const isTokenExpiring = (token: string | null) => {
+  if (!token) return true;
+  const expiresAt = tokenExpiresAt(token);
+  return expiresAt === null || expiresAt - Date.now() < TOKEN_EXPIRY_MARGIN_MS;
+};
+
+const requestRefresh = async (): Promise<string | null> => {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) return null;
+
+  try {
+    const response = await fetch(`${API_URL}/api/auth/refresh`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    });
+
+    if (response.status === 401) {
+      // The refresh token was revoked or has expired: the session is over
+      localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
+      window.dispatchEvent(new Event(SESSION_EXPIRED_EVENT));
+      return null;
+    }
+
+    if (!response.ok) return null;
+
+    const data = await response.json();
+    localStorage.setItem('token', data.access_token);
+    localStorage.setItem('refresh_token', data.refresh_token);
+    return data.access_token;
+  } catch (error) {
+    console.error('Token refresh error:', error);
+    return null;
+  }
+};
+
+// Refresh tokens rotate on every use, so concurrent callers share one request
+export const refreshAccessToken = () => {
+  if (!refreshInFlight) {
+    refreshInFlight = requestRefresh().finally(() => {
+      refreshInFlight = null;
+    });
+  }
+  return refreshInFlight;
+};
+
+// fetch() for authenticated API calls: a 401 refreshes the access token and
+// retries the request once with the new one
+export const apiFetch = async (url: string, init: RequestInit = {}) => {
+  const response = await fetch(url, init);
+  if (response.status !== 401) return response;
+
+  const headers = new Headers(init.headers);
+  if (!headers.has('Authorization')) return response;
+
+  const token = await refreshAccessToken();
+  if (!token) return response;
+
+  headers.set('Authorization', `Bearer ${token}`);
+  return fetch(url, { ...init, headers });
+};
+
+// The doctor directory is cached with the version it was served at, so the
+// dashboard bootstrap and /api/doctors only resend it after it changes
+const DOCTOR_DIRECTORY_KEY = 'doctor_directory';
+
+export const loadCachedDoctors = (): { version: string; doctors: any[] } | null => {
+  try {
+    return JSON.parse(localStorage.getItem(DOCTOR_DIRECTORY_KEY) || 'null');
+  } catch {
+    return null;
+  }
+};
+
+export const storeCachedDoctors = (version: string, doctors: any[]) => {
+  localStorage.setItem(DOCTOR_DIRECTORY_KEY, JSON.stringify({ version, doctors }));
+};
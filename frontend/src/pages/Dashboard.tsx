@@ -19,6 +19,7 @@ import { CheckCheck, FileEdit } from "lucide-react";
 import { Label } from "@/components/ui/label";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { Input } from "@/components/ui/input";
+import { apiFetch, loadCachedDoctors, storeCachedDoctors } from "@/lib/api";
 
 const Dashboard = () => {
   const { user, isAuthenticated, onboardingComplete } = useAuth();
@@ -43,6 +44,10 @@ const Dashboard = () => {
     medicationsAdministered: 0
   });
   const [shiftNotes, setShiftNotes] = useState<any[]>([]);
+  const [upcomingAppointments, setUpcomingAppointments] = useState<any[]>([]);
+  const [isBootstrapLoading, setIsBootstrapLoading] = useState(true);
+  const [doctorAppointments, setDoctorAppointments] = useState<any[]>([]);
+  const [isDoctorAppointmentsLoading, setIsDoctorAppointmentsLoading] = useState(true);
   
   useEffect(() => {
     if (!isAuthenticated) {
@@ -63,7 +68,13 @@ const Dashboard = () => {
   }, [isAuthenticated, navigate, onboardingComplete, toast, user]);
   
   useEffect(() => {
-    if (user?.role === 'nurse') {
+    if (!user) return;
+    
+    fetchBootstrap();
+    if (user.role === 'doctor') {
+      fetchDoctorAppointments();
+    }
+    if (user.role === 'nurse') {
       fetchMonitoredPatients();
       fetchShiftStats();
     }
@@ -82,6 +93,76 @@ const Dashboard = () => {
     return 'Good Evening';
   };
 
+  // Upcoming appointments and the doctor directory arrive in one request; the
+  // directory is only sent when the cached copy is out of date
+  const fetchBootstrap = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      if (!token) {
+        throw new Error('Authentication token not found');
+      }
+      
+      const cached = loadCachedDoctors();
+      const params = cached ? `?doctors_version=${encodeURIComponent(cached.version)}` : '';
+      const response = await apiFetch(`http://127.0.0.1:5000/api/dashboard/bootstrap${params}`, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'X-Causal-Token': localStorage.getItem('causal_token') || ''
+        }
+      });
+      
+      if (!response.ok) {
+        throw new Error('Failed to load dashboard');
+      }
+      
+      const data = await response.json();
+      setUpcomingAppointments(data.appointments);
+      if (data.doctors && data.doctors_version !== null) {
+        storeCachedDoctors(String(data.doctors_version), data.doctors);
+      }
+    } catch (error) {
+      toast({
+        title: "Error",
+        description: "Failed to load appointments",
+        variant: "destructive"
+      });
+    } finally {
+      setIsBootstrapLoading(false);
+    }
+  };
+  
+  // The doctor widgets need past appointments too, which the bootstrap leaves
+  // out, so they share one full list instead of each fetching it
+  const fetchDoctorAppointments = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      if (!token) {
+        throw new Error('Authentication token not found');
+      }
+      
+      const response = await apiFetch('http://127.0.0.1:5000/api/appointments', {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'X-Causal-Token': localStorage.getItem('causal_token') || ''
+        }
+      });
+      
+      if (!response.ok) {
+        throw new Error('Failed to fetch appointments');
+      }
+      
+      setDoctorAppointments(await response.json());
+    } catch (error) {
+      toast({
+        title: "Error",
+        description: "Failed to load appointments",
+        variant: "destructive"
+      });
+    } finally {
+      setIsDoctorAppointmentsLoading(false);
+    }
+  };
+  
   const fetchMonitoredPatients = async () => {
     try {
       const token = localStorage.getItem('token');
@@ -89,7 +170,7 @@ const Dashboard = () => {
 
       console.log("Fetching patients with token:", token.substring(0, 10) + "...");
 
-      const response = await fetch('http://127.0.0.1:5000/api/nurse/patients', {
+      const response = await apiFetch('http://127.0.0.1:5000/api/nurse/patients', {
         method: 'GET',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -125,7 +206,7 @@ const Dashboard = () => {
 
       console.log("Fetching shift stats with token:", token.substring(0, 10) + "...");
 
-      const response = await fetch('http://127.0.0.1:5000/api/nurse/shift-stats', {
+      const response = await apiFetch('http://127.0.0.1:5000/api/nurse/shift-stats', {
         method: 'GET',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -186,7 +267,7 @@ const Dashboard = () => {
 
       console.log("Sending patient data:", JSON.stringify(newPatient));
 
-      const response = await fetch('http://127.0.0.1:5000/api/nurse/patients', {
+      const response = await apiFetch('http://127.0.0.1:5000/api/nurse/patients', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -241,7 +322,7 @@ const Dashboard = () => {
       const token = localStorage.getItem('token');
       if (!token) return;
 
-      const response = await fetch(`http://127.0.0.1:5000/api/nurse/patients/${selectedPatient._id}`, {
+      const response = await apiFetch(`http://127.0.0.1:5000/api/nurse/patients/${selectedPatient._id}`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
@@ -441,7 +522,11 @@ const Dashboard = () => {
                 <CardDescription>Scheduled patient consultations</CardDescription>
               </CardHeader>
               <CardContent>
-                <DoctorAppointments />
+                <DoctorAppointments
+                  appointments={doctorAppointments}
+                  isLoading={isDoctorAppointmentsLoading}
+                  onAppointmentsChange={setDoctorAppointments}
+                />
               </CardContent>
             </Card>
             
@@ -451,7 +536,7 @@ const Dashboard = () => {
                 <CardDescription>Your current patient statistics</CardDescription>
               </CardHeader>
               <CardContent>
-                <AppointmentStats />
+                <AppointmentStats appointments={doctorAppointments} isLoading={isDoctorAppointmentsLoading} />
               </CardContent>
             </Card>
             
@@ -461,7 +546,7 @@ const Dashboard = () => {
                 <CardDescription>Latest updates and records</CardDescription>
               </CardHeader>
               <CardContent>
-                <RecentPatientNotes />
+                <RecentPatientNotes appointments={doctorAppointments} isLoading={isDoctorAppointmentsLoading} />
               </CardContent>
             </Card>
           </div>
@@ -604,7 +689,7 @@ const Dashboard = () => {
               </CardHeader>
               <CardContent>
                 <div className="space-y-4">
-                  <AppointmentsPreview />
+                  <AppointmentsPreview appointments={upcomingAppointments} isLoading={isBootstrapLoading} />
                   
                   <Button 
                     className="w-full mt-2 bg-hospital-500 hover:bg-hospital-600"
@@ -851,53 +936,12 @@ const Dashboard = () => {
   );
 };
 
-const AppointmentsPreview = () => {
-  const { user } = useAuth();
-  const [appointments, setAppointments] = useState<any[]>([]);
-  const [isLoading, setIsLoading] = useState(true);
+const AppointmentsPreview = ({ appointments: upcoming, isLoading }: { appointments: any[]; isLoading: boolean }) => {
   const navigate = useNavigate();
   const { toast } = useToast();
-
-  useEffect(() => {
-    const fetchAppointments = async () => {
-      try {
-        const token = localStorage.getItem('token');
-        if (!token) {
-          throw new Error('Authentication token not found');
-        }
-
-        const response = await fetch('http://127.0.0.1:5000/api/appointments', {
-          headers: {
-            'Authorization': `Bearer ${token}`
-          }
-        });
-
-        if (!response.ok) {
-          throw new Error('Failed to fetch appointments');
-        }
-
-        const data = await response.json();
-        
-        // Sort appointments by date (most recent first)
-        data.sort((a: any, b: any) => {
-          return new Date(a.date).getTime() - new Date(b.date).getTime();
-        });
-        
-        // Take only the first 2 appointments
-        setAppointments(data.slice(0, 2));
-      } catch (error) {
-        toast({
-          title: "Error",
-          description: "Failed to load appointments",
-          variant: "destructive"
-        });
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    fetchAppointments();
-  }, [toast]);
+  
+  // The bootstrap already sorts upcoming appointments by date and time
+  const appointments = upcoming.slice(0, 2);
 
   if (isLoading) {
     return <div className="text-center py-2">Loading appointments...</div>;
@@ -954,7 +998,7 @@ const AppointmentsPreview = () => {
                       throw new Error('Authentication token not found');
                     }
 
-                    const response = await fetch(`http://127.0.0.1:5000/api/appointments/${appointment._id}`, {
+                    const response = await apiFetch(`http://127.0.0.1:5000/api/appointments/${appointment._id}`, {
                       method: 'PUT',
                       headers: {
                         'Content-Type': 'application/json',
@@ -963,6 +1007,9 @@ const AppointmentsPreview = () => {
                       body: JSON.stringify({ status: 'cancelled' })
                     });
 
+                    const causalToken = response.headers.get('X-Causal-Token');
+                    if (causalToken) localStorage.setItem('causal_token', causalToken);
+
                     if (!response.ok) {
                       throw new Error('Failed to cancel appointment');
                     }
@@ -993,11 +1040,17 @@ const AppointmentsPreview = () => {
   );
 };
 
-const DoctorAppointments = () => {
+const DoctorAppointments = ({
+  appointments,
+  isLoading,
+  onAppointmentsChange
+}: {
+  appointments: any[];
+  isLoading: boolean;
+  onAppointmentsChange: (appointments: any[]) => void;
+}) => {
   const { toast } = useToast();
-  const [appointments, setAppointments] = useState<any[]>([]);
   const [filteredAppointments, setFilteredAppointments] = useState<any[]>([]);
-  const [isLoading, setIsLoading] = useState(true);
   const [selectedAppointment, setSelectedAppointment] = useState<any>(null);
   const [isDialogOpen, setIsDialogOpen] = useState(false);
   const [doctorNotes, setDoctorNotes] = useState("");
@@ -1005,44 +1058,8 @@ const DoctorAppointments = () => {
   const [filterType, setFilterType] = useState<'today' | 'upcoming' | 'all'>('all');
 
   useEffect(() => {
-    const fetchAppointments = async () => {
-      try {
-        const token = localStorage.getItem('token');
-        if (!token) {
-          throw new Error('Authentication token not found');
-        }
-
-        const response = await fetch('http://127.0.0.1:5000/api/appointments', {
-          headers: {
-            'Authorization': `Bearer ${token}`
-          }
-        });
-
-        if (!response.ok) {
-          throw new Error('Failed to fetch appointments');
-        }
-
-        const data = await response.json();
-        console.log("Fetched appointments:", data);
-        
-        // Store all appointments
-        setAppointments(data);
-        
-        // Filter for all appointments by default
-        filterAppointmentsByDate('all', data);
-      } catch (error) {
-        toast({
-          title: "Error",
-          description: "Failed to load appointments",
-          variant: "destructive"
-        });
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    fetchAppointments();
-  }, [toast]);
+    filterAppointmentsByDate(filterType, appointments);
+  }, [appointments]);
 
   const filterAppointmentsByDate = (type: 'today' | 'upcoming' | 'all', data = appointments) => {
     setFilterType(type);
@@ -1091,7 +1108,7 @@ const DoctorAppointments = () => {
         throw new Error('Authentication token not found');
       }
 
-      const response = await fetch(`http://127.0.0.1:5000/api/appointments/${selectedAppointment._id}`, {
+      const response = await apiFetch(`http://127.0.0.1:5000/api/appointments/${selectedAppointment._id}`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
@@ -1103,6 +1120,9 @@ const DoctorAppointments = () => {
         })
       });
 
+      const causalToken = response.headers.get('X-Causal-Token');
+      if (causalToken) localStorage.setItem('causal_token', causalToken);
+
       if (!response.ok) {
         throw new Error('Failed to update appointment');
       }
@@ -1123,8 +1143,7 @@ const DoctorAppointments = () => {
         apt._id === selectedAppointment._id ? updatedAppointment : apt
       );
       
-      setAppointments(updatedAppointments);
-      filterAppointmentsByDate(filterType, updatedAppointments);
+      onAppointmentsChange(updatedAppointments);
       
       setIsDialogOpen(false);
     } catch (error) {
@@ -1308,57 +1327,22 @@ const DoctorAppointments = () => {
   );
 };
 
-const AppointmentStats = () => {
-  const [stats, setStats] = useState({
-    totalPatients: 0,
-    appointmentsToday: 0,
-    followUps: 0,
-    labResults: 0
-  });
-  const [isLoading, setIsLoading] = useState(true);
-
-  useEffect(() => {
-    const fetchStats = async () => {
-      try {
-        const token = localStorage.getItem('token');
-        if (!token) {
-          throw new Error('Authentication token not found');
-        }
-
-        const response = await fetch('http://127.0.0.1:5000/api/appointments', {
-          headers: {
-            'Authorization': `Bearer ${token}`
-          }
-        });
-
-        if (!response.ok) {
-          throw new Error('Failed to fetch appointments');
-        }
-
-        const data = await response.json();
-        
-        // Calculate stats
-        const today = new Date().toISOString().split('T')[0];
-        const uniquePatients = new Set(data.map((apt: any) => apt.patient_id));
-        const todaysAppointments = data.filter((apt: any) => apt.date === today);
-        
-        setStats({
-          totalPatients: uniquePatients.size,
-          appointmentsToday: todaysAppointments.length,
-          followUps: data.filter((apt: any) => 
-            apt.status === 'completed' && !apt.doctor_notes
-          ).length,
-          labResults: Math.floor(Math.random() * 10) // Mocked for now
-        });
-      } catch (error) {
-        console.error("Error fetching stats:", error);
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    fetchStats();
-  }, []);
+const AppointmentStats = ({ appointments: data, isLoading }: { appointments: any[]; isLoading: boolean }) => {
+  // Lab results are mocked, so keep the number stable across re-renders
+  const [labResults] = useState(() => Math.floor(Math.random() * 10));
+  
+  // Calculate stats
+  const today = new Date().toISOString().split('T')[0];
+  const uniquePatients = new Set(data.map((apt: any) => apt.patient_id));
+  const todaysAppointments = data.filter((apt: any) => apt.date === today);
+  const stats = {
+    totalPatients: uniquePatients.size,
+    appointmentsToday: todaysAppointments.length,
+    followUps: data.filter((apt: any) => 
+      apt.status === 'completed' && !apt.doctor_notes
+    ).length,
+    labResults
+  };
 
   if (isLoading) {
     return <div className="text-center py-4">Loading statistics...</div>;
@@ -1390,48 +1374,14 @@ const AppointmentStats = () => {
   );
 };
 
-const RecentPatientNotes = () => {
-  const [appointments, setAppointments] = useState<any[]>([]);
-  const [isLoading, setIsLoading] = useState(true);
-
-  useEffect(() => {
-    const fetchAppointmentsWithNotes = async () => {
-      try {
-        const token = localStorage.getItem('token');
-        if (!token) {
-          throw new Error('Authentication token not found');
-        }
-
-        const response = await fetch('http://127.0.0.1:5000/api/appointments', {
-          headers: {
-            'Authorization': `Bearer ${token}`
-          }
-        });
-
-        if (!response.ok) {
-          throw new Error('Failed to fetch appointments');
-        }
-
-        const data = await response.json();
-        
-        // Filter appointments with doctor notes
-        const appointmentsWithNotes = data
-          .filter((apt: any) => apt.doctor_notes)
-          .sort((a: any, b: any) => 
-            new Date(b.created_at).getTime() - new Date(a.created_at).getTime()
-          )
-          .slice(0, 3); // Get only the 3 most recent
-        
-        setAppointments(appointmentsWithNotes);
-      } catch (error) {
-        console.error("Error fetching appointments with notes:", error);
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    fetchAppointmentsWithNotes();
-  }, []);
+const RecentPatientNotes = ({ appointments: data, isLoading }: { appointments: any[]; isLoading: boolean }) => {
+  // Filter appointments with doctor notes
+  const appointments = data
+    .filter((apt: any) => apt.doctor_notes)
+    .sort((a: any, b: any) => 
+      new Date(b.created_at).getTime() - new Date(a.created_at).getTime()
+    )
+    .slice(0, 3); // Get only the 3 most recent
 
   if (isLoading) {
     return <div className="text-center py-4">Loading patient notes...</div>;